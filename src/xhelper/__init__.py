@@ -1,4 +1,4 @@
 from .core.excel_helper import ExcelHelper
-from .core.file_comparator import compare_folders
+from .core.file_comparator import compare_folders, compare_snapshots
 
-__all__ = ['ExcelHelper', 'compare_folders']
+__all__ = ['ExcelHelper', 'compare_folders', 'compare_snapshots']
@@ -2,6 +2,10 @@ import argparse
 import os
 from xhelper import ExcelHelper
 from xhelper import compare_folders
+from xhelper import compare_snapshots
+from xhelper.core.query import run_query
+from xhelper.core.server import serve, run_client, run_client_compare, DEFAULT_IDLE_TIMEOUT
+from xhelper.core.writer import WRITER_BACKENDS
 
 def main():
     parser = argparse.ArgumentParser(
@@ -10,14 +14,67 @@ def main():
     parser.add_argument(
         '-f', '--folders',
         nargs='+',   # Permette uno o più percorsi
-        help="One or two folder paths."
+        help="One folder path, or two or more folders to compare (the first one is the baseline)."
     )
     parser.add_argument(
         "-dvg", "--dvg-base-file",
         help = "Base file to use for dvg remapping"
     )
+    parser.add_argument(
+        "--columns",
+        nargs='+',
+        help="Only read these columns (faster on wide files; 'save' is disabled)"
+    )
+    parser.add_argument(
+        "--rolling",
+        action="store_true",
+        help="With 3+ folders, show each snapshot's drift against the previous one instead of the baseline"
+    )
+    parser.add_argument(
+        "--matrix",
+        action="store_true",
+        help="With two folders, write the drift matrix report (txt, csv and json) used for 3+ folders"
+    )
+    parser.add_argument(
+        "--writer",
+        choices=WRITER_BACKENDS,
+        help="CSV writer backend for save/convert/dvg_remap (default: parallel)"
+    )
+    parser.add_argument(
+        "--query",
+        help="Run a 'query' command on the folder without loading it, e.g. --query \"SELECT * FROM AE\" "
+             "(use --query=\"--out file SELECT ...\" to save the result)"
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run a background server that keeps loaded folders in memory"
+    )
+    parser.add_argument(
+        "--connect",
+        action="store_true",
+        help="Send commands for the given folder (or a comparison of 2+ folders) to a running server"
+    )
+    parser.add_argument(
+        "-c", "--command",
+        nargs='+',
+        help="Commands to run with --connect (read from stdin if omitted)"
+    )
+    parser.add_argument(
+        "--socket",
+        help="Unix socket path for --serve/--connect"
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=DEFAULT_IDLE_TIMEOUT,
+        help="Seconds after which an unused folder is unloaded by the server"
+    )
     args = parser.parse_args()
 
+    if args.serve:
+        return serve(args.socket, args.idle_timeout)
+
     # Se l'utente non specifica cartelle, errore
     if not args.folders:
         print("Error: no directory path entered. Please use '-h' flag to display help menu.")
@@ -28,10 +85,33 @@ def main():
             print("Error: dvg base file provided does not exist.")
             return 1
 
+    if args.query:
+        # Query direttamente da disco con DuckDB: nessun file viene caricato in pandas
+        if len(args.folders) != 1 or args.connect:
+            print("Error: --query works on exactly one folder and cannot be combined with --connect.")
+            return 1
+        return 0 if run_query(args.folders[0], args.query) else 1
+
+    # --rolling ha senso solo sulla matrice: con due cartelle la richiede implicitamente
+    matrix = args.matrix or args.rolling
+    if matrix and len(args.folders) < 2:
+        print("Error: --matrix and --rolling need at least two folders.")
+        return 1
+
+    if args.connect:
+        if len(args.folders) > 1:
+            if args.command:
+                print("Error: -c/--command can only be used with a single folder.")
+                return 1
+            return run_client_compare(args.folders, args.columns, args.rolling, args.socket, matrix=matrix)
+        dvg_base_file = os.path.abspath(args.dvg_base_file) if args.dvg_base_file else None
+        return run_client(args.folders[0], args.command, dvg_base_file, args.socket,
+                          columns=args.columns, writer=args.writer)
+
     # Se passiamo esattamente DUE cartelle, facciamo la comparazione
-    if len(args.folders) == 2:
+    if len(args.folders) == 2 and not matrix:
         folder1, folder2 = args.folders
-        compare_folders(folder1, folder2)
+        compare_folders(folder1, folder2, columns=args.columns)
         return 0  # Fine immediata dopo aver mostrato i risultati
 
     # Altrimenti, se passiamo UNA sola cartella, eseguiamo la logica preesistente
@@ -41,10 +121,12 @@ def main():
             print("Error: provided path is not a valid directory, exiting.")
             return 1
 
-        xh = ExcelHelper(folder, dvg_base_file_path=args.dvg_base_file)
+        xh = ExcelHelper(folder, dvg_base_file_path=args.dvg_base_file, columns=args.columns,
+                         writer=args.writer)
         xh.cmdloop()
     else:
-        # Caso in cui l'utente abbia passato più di 2 cartelle
-        print("Error: please provide either 1 or 2 folder paths (not more).")
-        return 1
+        # Più di 2 cartelle (o 2 con --matrix): la prima è la baseline, le altre gli snapshot da confrontare
+        baseline, *snapshots = args.folders
+        compare_snapshots(baseline, snapshots, columns=args.columns, rolling=args.rolling)
+        return 0
 
@@ -7,6 +7,10 @@ import random
 import pyreadstat
 import csv
 
+from xhelper.utils import csv_output_name, parse_compress_option, pop_flag
+from xhelper.core.writer import write_csv
+from xhelper.core.manifest import Manifest
+
 def do_show(self: "ExcelHelper", arg):
     """
     Show details about columns.
@@ -14,6 +18,7 @@ def do_show(self: "ExcelHelper", arg):
     Usage:
       show all              - Show all columns
       show rep              - Show all columns that appear in multiple files.
+      show dup              - Show groups of columns with identical contents across files
       show col 'name'       - Show details about a specific column
     """
     try:
@@ -30,13 +35,16 @@ def do_show(self: "ExcelHelper", arg):
         self.show_repeated_columns()
     elif args[0] == 'all':
         self.show_all_columns()
+    elif args[0] == 'dup':
+        self.show_duplicate_columns()
     elif args[0] == 'col' and len(args) > 1:
         column_name = args[1]
         if column_name in self.column_locations:
             files = self.column_locations[column_name]
             print(f"\nColumn '{column_name}' appears in {len(files)} files:")
             for file in files:
-                print(f"  - {file}")
+                label = self.column_label(file, column_name)
+                print(f"  - {file}" + (f" (label: {label})" if label else ""))
         else:
             print(f"\nColumn '{column_name}' not found in any file.")
     else:
@@ -50,29 +58,36 @@ def do_files(self: "ExcelHelper", arg):
         files         - Show basic file information (rows, columns, shared vs unique columns)
         files detail  - Show detailed file information including specific column names
     """
-    if not self.data:
+    file_columns = self.file_columns()
+    if not file_columns:
         print("\nNo files currently loaded.")
         return
 
     args = arg.split()
 
-    total_rows = sum(len(df) for df in self.data.values())
-    total_columns = sum(len(df.columns) for df in self.data.values())
+    def rows_str(filename):
+        rows = self.file_rows(filename)
+        return f"{rows:,}" if rows is not None else "unknown"
+
+    total_rows = sum(self.file_rows(f) or 0 for f in file_columns)
+    total_columns = sum(len(columns) for columns in file_columns.values())
 
     print(f"\nFolder: {self.folder_path}")
     print(f"Total files loaded: {len(self.data)}")
+    if self.sas_metadata:
+        print(f"Total SAS files indexed: {len(self.sas_metadata)}")
     print(f"Total rows across all files: {total_rows:,}")
     print(f"Total columns across all files: {total_columns:,}")
     print("\nFiles:")
 
     if args and args[0] == 'detail':
         # Vista dettagliata con nomi delle colonne
-        for filename, df in self.data.items():
+        for filename, columns in file_columns.items():
             print(f"\n{filename}:")
-            print(f"  Rows: {len(df):,}")
-            print(f"  Columns ({len(df.columns)}):")
-            repeated = [col for col in df.columns if col in self.repeated_columns]
-            unique = [col for col in df.columns if col not in self.repeated_columns]
+            print(f"  Rows: {rows_str(filename)}")
+            print(f"  Columns ({len(columns)}):")
+            repeated = [col for col in columns if col in self.repeated_columns]
+            unique = [col for col in columns if col not in self.repeated_columns]
             if repeated:
                 print("  Shared columns:")
                 for col in repeated:
@@ -84,12 +99,12 @@ def do_files(self: "ExcelHelper", arg):
                     print(f"    - {col}")
     else:
         # Vista di base
-        for filename, df in self.data.items():
-            shared = sum(1 for col in df.columns if col in self.repeated_columns)
-            unique = len(df.columns) - shared
+        for filename, columns in file_columns.items():
+            shared = sum(1 for col in columns if col in self.repeated_columns)
+            unique = len(columns) - shared
             print(f"\n{filename}:")
-            print(f"  Rows: {len(df):,}")
-            print(f"  Columns: {len(df.columns):,} total ({shared} shared, {unique} unique)")
+            print(f"  Rows: {rows_str(filename)}")
+            print(f"  Columns: {len(columns):,} total ({shared} shared, {unique} unique)")
 
 def do_rename(self: "ExcelHelper", arg):
     """
@@ -121,21 +136,31 @@ def do_rename(self: "ExcelHelper", arg):
         print("This may lead to duplicate columns or data overwrite. Operation aborted.")
         return
 
-    files_modified = []
-    for filename in self.column_locations[old_name]:
+    # I file SAS sono in sola lettura: si modificano solo i CSV
+    files_modified = [f for f in self.column_locations[old_name] if f in self.data]
+    sas_files = self.column_locations[old_name] - set(files_modified)
+    if not files_modified:
+        print(f"\nColumn '{old_name}' only appears in SAS files, which are read-only.")
+        return
+
+    for filename in files_modified:
         df = self.data[filename]
         df.rename(columns={old_name: new_name}, inplace=True)
-        files_modified.append(filename)
 
     print(f"\nRenamed column '{old_name}' to '{new_name}' in {len(files_modified)} files:")
     for file in files_modified:
         print(f"  - {file}")
+    if sas_files:
+        print(f"Column left unchanged in {len(sas_files)} read-only SAS files.")
 
     # Aggiorna la mappatura
-    self.column_locations[new_name] = self.column_locations.pop(old_name)
-    if old_name in self.repeated_columns:
-        self.repeated_columns.remove(old_name)
-        self.repeated_columns.add(new_name)
+    self.column_locations[new_name] = set(files_modified)
+    if sas_files:
+        self.column_locations[old_name] = sas_files
+    else:
+        del self.column_locations[old_name]
+    self.column_fingerprints[new_name] = self.column_fingerprints.pop(old_name)
+    self.repeated_columns = self.find_repeated_columns()
 
     self.modified = True
 
@@ -162,24 +187,36 @@ def do_delete(self: "ExcelHelper", arg):
         print(f"Column '{col_to_del}' not found in any file!")
         return
 
-    files_modified = []
-    for filename in self.column_locations[col_to_del]:
+    # I file SAS sono in sola lettura: si modificano solo i CSV
+    files_modified = [f for f in self.column_locations[col_to_del] if f in self.data]
+    sas_files = self.column_locations[col_to_del] - set(files_modified)
+    if not files_modified:
+        print(f"Column '{col_to_del}' only appears in SAS files, which are read-only.")
+        return
+
+    for filename in files_modified:
         df = self.data[filename]
         df.drop(columns=[col_to_del], inplace=True)
-        files_modified.append(filename)
 
     print(f"\nDeleted column '{col_to_del}' from {len(files_modified)} files:")
     for file in files_modified:
         print(f"  - {file}")
+    if sas_files:
+        print(f"Column kept in {len(sas_files)} read-only SAS files.")
 
     # Aggiorna la mappatura
-    del self.column_locations[col_to_del]
-    self.repeated_columns.discard(col_to_del)
+    if sas_files:
+        self.column_locations[col_to_del] = sas_files
+    else:
+        del self.column_locations[col_to_del]
+    self.column_fingerprints.pop(col_to_del, None)
+    self.repeated_columns = self.find_repeated_columns()
     self.modified = True
 
 def do_save(self: "ExcelHelper", arg):
     """
     Save changes to all modified files.
+    Compressed files (.csv.gz, .csv.zst, ...) are written back compressed.
 
     Usage:
         save
@@ -188,20 +225,26 @@ def do_save(self: "ExcelHelper", arg):
         print("No changes to save!")
         return
 
+    if self.projection:
+        # Salvare ora riscriverebbe i file con le sole colonne caricate
+        print("Files were loaded with --columns: saving would drop every other column.")
+        print("Restart xhelper without --columns to save changes.")
+        return
+
     saved_files = []
     errors = []
     for filename, df in self.data.items():
         try:
             file_path = Path(self.folder_path) / filename
-            df.to_csv(file_path, index=False)
-            saved_files.append(filename)
+            stats = write_csv(df, file_path, backend=self.writer)
+            saved_files.append((filename, stats))
         except Exception as e:
             errors.append((filename, str(e)))
 
     if saved_files:
         print(f"\nSuccessfully saved {len(saved_files)} files:")
-        for file in saved_files:
-            print(f"  - {file}")
+        for file, stats in saved_files:
+            print(f"  - {file} ({stats})")
 
     if errors:
         print("\nErrors occurred while saving:")
@@ -215,8 +258,23 @@ def do_convert_sas_to_csv(self: "ExcelHelper", arg):
     Convert all .sas7bdat files in the folder to .csv.
 
     Usage:
-        convert
+        convert                  - Write plain .csv files
+        convert --compress zst   - Write compressed files (gz, bz2, xz or zst)
+        convert --force          - Reconvert every file, even those that are up to date
+
+    Files already converted from an unchanged .sas7bdat are skipped, and files
+    left half-written by an interrupted run are converted again.
     """
+    try:
+        compress, args = parse_compress_option(shlex.split(arg))
+        force, args = pop_flag(args, '--force')
+    except ValueError as e:
+        print(f"\nError parsing arguments: {e}")
+        return
+    if args:
+        print("\nInvalid convert command. Use 'help convert' for usage information.")
+        return
+
     sas_files = [f for f in os.listdir(self.folder_path) if f.lower().endswith('.sas7bdat')]
 
     if not sas_files:
@@ -228,22 +286,35 @@ def do_convert_sas_to_csv(self: "ExcelHelper", arg):
 
     print(f"Found {len(sas_files)} .sas7bdat files. Starting conversion...")
 
+    manifest = Manifest(output_folder)
+    if manifest.clean_partials():
+        print("Removed partially written files from an interrupted run.")
+
+    skipped = 0
     for sas_file in sas_files:
         try:
             sas_path = Path(self.folder_path) / sas_file
-            csv_file_name = sas_file.replace('.sas7bdat', '.csv')
-            csv_path = output_folder / csv_file_name
+            csv_file_name = csv_output_name(sas_file.replace('.sas7bdat', ''), compress)
+
+            # Già convertito da questo stesso file SAS
+            if not force and manifest.is_up_to_date(csv_file_name, sas_path):
+                skipped += 1
+                continue
 
             # Legge il file SAS
             df, meta = pyreadstat.read_sas7bdat(sas_path)
 
-            # Salva come CSV
-            df.to_csv(csv_path, index=False)
-            print(f"✓ Converted: {sas_file} -> {csv_file_name}")
+            # Salva come CSV (su un file temporaneo, reso definitivo solo a scrittura completata)
+            stats = write_csv(df, manifest.partial_path(csv_file_name), backend=self.writer)
+            manifest.commit(csv_file_name, sas_path)
+            print(f"✓ Converted: {sas_file} -> {csv_file_name} ({stats})")
 
         except Exception as e:
             print(f"✗ Error converting {sas_file}: {e}")
 
+    if skipped:
+        print(f"Skipped {skipped} up-to-date files (use 'convert --force' to reconvert them).")
+
     print(f"All files have been processed. Converted CSVs are in {output_folder}.")
 
 def do_quit(self: "ExcelHelper", arg):
@@ -288,7 +359,7 @@ def do_xml_generation(self: "ExcelHelper", arg):
     - NaN/None are excluded from unique counts and values listing.
     - Tries to auto-convert object columns to numeric if possible, to detect numeric values.
     """
-    if not self.data:
+    if not self.column_locations:
         print("\nNo data is currently loaded. Cannot generate CSV.")
         return
 
@@ -317,7 +388,8 @@ def do_xml_generation(self: "ExcelHelper", arg):
         # -----------------------------------------------------
         all_values = []
         for filename in files_for_col:
-            serie = self.data[filename][col]
+            # I file SAS vengono letti (e tenuti in memoria) solo al primo utilizzo
+            serie = self.get_frame(filename)[col]
 
             # (3) Riconoscimento automatico del tipo
             # Proviamo a convertire la serie in numerico
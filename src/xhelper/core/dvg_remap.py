@@ -1,63 +1,354 @@
+import json
 import os
+import shlex
+from dataclasses import dataclass, field
+from pathlib import Path
 
 import pandas as pd
 
 from xhelper import core
+from xhelper.utils import (get_cache_dir, strip_csv_suffix, csv_output_name, parse_compress_option,
+                           is_csv_file, hash_files, pop_flag)
+from xhelper.core.projection import (map_header_locations, plan_projection, projected_folder_headers,
+                                     read_csv_passthrough)
+from xhelper.core.writer import write_csv
+from xhelper.core.manifest import Manifest
+
+STRUCTURE_FILE = "dbstructure"
+"""Nome (senza estensione) del file con la struttura del database, anche se compresso"""
+PLAN_CACHE_FILE = "dvg_plan.json"
+PLAN_FORMAT = 3
+"""Versione del formato del piano: cambiarla invalida i piani già in cache"""
+
+
+@dataclass
+class DvgPlan:
+    """
+    Piano di remap compilato dai due file di input:
+        DCM_name -> colonna -> DVG_VAL -> DVG_LVAL
+    """
+    key: str
+    """Hash del contenuto di dbstructure.csv e del dvg base file"""
+
+    columns: dict[str, dict[str, dict[str, str]]] = field(default_factory=dict)
+    """{DCM_name: {colonna: {DVG_VAL normalizzato: DVG_LVAL}}}"""
+
+    inactive: dict[str, dict[str, set[str]]] = field(default_factory=dict)
+    """{DCM_name: {colonna: set di DVG_VAL con ACTIVE_FLAG diverso da 'Y'}}"""
+
+    missing_subsets: list[tuple[str, str, str]] = field(default_factory=list)
+    """(DCM_name, colonna, subset) il cui subset non esiste nel dvg base file"""
+
+
+def _plan_to_json(plan: DvgPlan) -> dict:
+    """Il piano in forma JSON (i set diventano liste ordinate)."""
+    return {
+        'key': plan.key,
+        'columns': plan.columns,
+        'inactive': {dcm: {col: sorted(codes) for col, codes in cols.items()} for dcm, cols in plan.inactive.items()},
+        'missing_subsets': [list(entry) for entry in plan.missing_subsets],
+    }
+
+
+def _plan_from_json(data: dict) -> DvgPlan:
+    return DvgPlan(
+        key=data['key'],
+        columns=data['columns'],
+        inactive={dcm: {col: set(codes) for col, codes in cols.items()} for dcm, cols in data['inactive'].items()},
+        missing_subsets=[tuple(entry) for entry in data['missing_subsets']],
+    )
+
+
+def _normalize_code(value) -> str:
+    """
+    Rende confrontabili codici letti come 1 (int) o 1.0 (float, es. colonna con NaN).
+    Le stringhe restano come sono: '01' e '1' sono codici DVG diversi.
+    """
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def compile_plan(structure_df: pd.DataFrame, dvg_df: pd.DataFrame, key: str) -> DvgPlan:
+    """Compila il piano di remap unendo dbstructure e dvg base file (vettoriale, niente iterrows)."""
+    plan = DvgPlan(key=key)
+
+    dvg = dvg_df[['DVG_NAME', 'DVG_SUBSET_NM', 'DVG_VAL', 'DVG_LVAL']].copy()
+    dvg['subset'] = dvg['DVG_SUBSET_NM'].map(_normalize_code)
+    dvg['value'] = dvg['DVG_VAL'].map(_normalize_code)
+    if 'ACTIVE_FLAG' in dvg_df.columns:
+        dvg['active'] = dvg_df['ACTIVE_FLAG'].astype(str).str.strip().str.upper().eq('Y')
+    else:
+        dvg['active'] = True
+
+    # (DVG_NAME, subset) -> {valore: etichetta} e set di valori inattivi
+    values = {}
+    inactive = {}
+    for (dvg_name, subset), group in dvg.groupby(['DVG_NAME', 'subset'], sort=False):
+        values[(dvg_name, subset)] = dict(zip(group['value'], group['DVG_LVAL']))
+        inactive[(dvg_name, subset)] = set(group.loc[~group['active'], 'value'])
+
+    structure = structure_df.loc[structure_df['DVG_SUBSET_NM'].notna(), ['DCM_name', 'Question', 'DVG_SUBSET_NM']]
+    for dcm, question, subset in structure.itertuples(index=False):
+        subset = _normalize_code(subset)
+        mapping = values.get((question, subset))
+        if mapping is None:
+            plan.missing_subsets.append((dcm, question, subset))
+            continue
+        plan.columns.setdefault(dcm, {})[question] = mapping
+        if inactive[(question, subset)]:
+            plan.inactive.setdefault(dcm, {})[question] = inactive[(question, subset)]
+    return plan
+
+
+def find_structure_file(self: "core.excel_helper.ExcelHelper"):
+    """Nome del file dbstructure nella cartella (.csv o compresso), o None."""
+    for name in [*self.data, *os.listdir(self.folder_path)]:
+        if is_csv_file(name) and strip_csv_suffix(name) == STRUCTURE_FILE:
+            return name
+    return None
+
+
+def load_plan(self: "core.excel_helper.ExcelHelper") -> DvgPlan:
+    """
+    Ritorna il piano di remap, ricompilandolo solo se dbstructure.csv o il
+    dvg base file sono cambiati rispetto alla versione in cache.
+    """
+    structure_name = find_structure_file(self)
+    structure_path = Path(self.folder_path) / structure_name
+    key = f"{PLAN_FORMAT}:{hash_files(structure_path, self.dvg_base_file_path)}"
+    cache_dir = get_cache_dir(self.folder_path)
+    cache_path = cache_dir / PLAN_CACHE_FILE if cache_dir else None
+
+    # JSON e non pickle: la cache sta nella cartella dati, spesso condivisa
+    if cache_path and cache_path.exists():
+        try:
+            with open(cache_path, encoding='utf-8') as fh:
+                plan = _plan_from_json(json.load(fh))
+            if plan.key == key:
+                return plan
+        except Exception:
+            pass  # Cache illeggibile: ricompiliamo
+
+    # Con --columns dbstructure potrebbe non essere tra i file caricati
+    structure_df = self.data[structure_name] if structure_name in self.data else pd.read_csv(structure_path)
+    plan = compile_plan(structure_df, self.dvg_file, key)
+    if cache_path is None:
+        return plan
+    try:
+        with open(cache_path, 'w', encoding='utf-8') as fh:
+            json.dump(_plan_to_json(plan), fh)
+    except OSError as e:
+        print(f"Warning: could not cache DVG plan: {e}")
+    return plan
+
+
+def _file_columns(plan: DvgPlan, filename: str) -> dict[str, dict[str, str]]:
+    """Colonne da rimappare per un file, cercando il DCM sia per nome file che senza estensione."""
+    return plan.columns.get(filename) or plan.columns.get(strip_csv_suffix(filename), {})
+
+
+def _file_inactive(plan: DvgPlan, filename: str) -> dict[str, set[str]]:
+    return plan.inactive.get(filename) or plan.inactive.get(strip_csv_suffix(filename), {})
+
+
+def _code_lookup(series: pd.Series, mapping: dict[str, str]) -> dict:
+    """Dizionario valore originale -> etichetta, calcolato solo sui valori distinti."""
+    return {value: mapping.get(_normalize_code(value)) for value in series.dropna().unique()}
+
+
+def plan_remap_columns(self: "core.excel_helper.ExcelHelper", plan: DvgPlan) -> dict[str, list[str]]:
+    """
+    Colonne da rimappare per ogni file, ricavate da column_locations
+    (o dalle intestazioni su disco se i file sono stati caricati con --columns).
+    """
+    if self.projection:
+        filenames = [f for f in os.listdir(self.folder_path) if is_csv_file(f)]
+        locations = map_header_locations(projected_folder_headers(self.folder_path, filenames))
+    else:
+        locations = self.column_locations
+
+    wanted = {col for columns in plan.columns.values() for col in columns}
+    remap = {}
+    for name, columns in plan_projection(locations, wanted).items():
+        # I file SAS non vengono rimappati (vanno prima convertiti con 'convert')
+        if not is_csv_file(name) or strip_csv_suffix(name) in [STRUCTURE_FILE, 'dvg']:
+            continue
+        file_columns = _file_columns(plan, name)
+        columns = [col for col in columns if col in file_columns]
+        if columns:
+            remap[name] = columns
+    return remap
+
+
+def _read_remap_columns(self: "core.excel_helper.ExcelHelper", remap: dict[str, list[str]]) -> dict[str, pd.DataFrame]:
+    """Solo le colonne da rimappare: dai dati in memoria, o da disco con usecols se c'è una proiezione."""
+    if not self.projection:
+        return {name: self.data[name][columns] for name, columns in remap.items()}
+    return {
+        name: pd.read_csv(Path(self.folder_path) / name, usecols=columns)
+        for name, columns in remap.items()
+    }
+
+
+def validate_plan(plan: DvgPlan, frames: dict[str, pd.DataFrame]) -> bool:
+    """
+    Controlla il piano contro i dati prima di riscrivere qualsiasi file.
+
+    Args:
+        frames: {nome_file: DataFrame con (almeno) le colonne da rimappare}
+
+    Returns:
+        bool: True se tutti i valori delle colonne da rimappare hanno un'etichetta
+              (subset mancanti e codici inattivi sono solo avvisi).
+    """
+    unmapped = []
+    inactive_used = []
+    for name, df in frames.items():
+        columns = _file_columns(plan, name)
+        inactive = _file_inactive(plan, name)
+        for col in columns.keys() & set(df.columns):
+            codes = {_normalize_code(v) for v in df[col].dropna().unique()}
+            missing = sorted(codes - columns[col].keys())
+            if missing:
+                unmapped.append((name, col, missing))
+            used_inactive = sorted(codes & inactive.get(col, set()))
+            if used_inactive:
+                inactive_used.append((name, col, used_inactive))
+
+    print(f"\nDVG plan: {sum(len(c) for c in plan.columns.values())} columns mapped "
+          f"across {len(plan.columns)} DCMs")
+
+    # Solo i valori senza etichetta nei file da rimappare sono errori: diventerebbero celle vuote
+    if unmapped:
+        print(f"\nError: {len(unmapped)} columns contain values with no DVG_LVAL:")
+        for name, col, missing in unmapped:
+            print(f"  - {name}: '{col}' -> {', '.join(missing)}")
+
+    # Subset mancanti (colonne lasciate invariate) e codici inattivi (che hanno comunque un'etichetta)
+    if plan.missing_subsets:
+        print(f"\nWarning: {len(plan.missing_subsets)} columns reference a subset missing "
+              f"from the DVG base file and will be left unchanged:")
+        for dcm, col, subset in plan.missing_subsets:
+            print(f"  - {dcm}.{col} (subset {subset})")
+    if inactive_used:
+        print(f"\nWarning: {len(inactive_used)} columns contain inactive (ACTIVE_FLAG) codes:")
+        for name, col, codes in inactive_used:
+            print(f"  - {name}: '{col}' -> {', '.join(codes)}")
+
+    ok = not unmapped
+    if ok:
+        print("No blocking problems found.")
+    return ok
+
+
 def do_dvg_remap(self: "core.excel_helper.ExcelHelper", arg):
     """
-    1. map column name (question) -> subset number
-    2. map (subset, dvg_value) -> string
-    3. substitute dvg_value in db:
-        col_name -> subset number -> dvg_value -> string
+    Replace DVG codes with their labels (DVG_LVAL) using dbstructure.csv and the dvg base file.
+
+    Usage:
+        dvg_remap                 - Validate the remap plan, then write remapped files to transformed_data/
+        dvg_remap --compress zst  - Same, writing compressed files (gz, bz2, xz or zst)
+        dvg_remap --force         - Rewrite every file, even those that are up to date
+        dvg_remap --ignore-errors - Write the files even if some values have no DVG_LVAL
+        dvg_remap check           - Only validate the remap plan against the loaded files
+
+    The plan (DCM_name -> column -> DVG_VAL -> DVG_LVAL) is compiled once and cached
+    until dbstructure.csv or the dvg base file change. When xhelper was started with
+    --columns, only the remapped columns are read for validation and every other
+    column is copied to the output as raw text.
+
+    Runs are incremental: outputs whose source file and plan are unchanged since
+    they were written are skipped, and files left half-written are redone.
     """
+    try:
+        compress, args = parse_compress_option(shlex.split(arg))
+        force, args = pop_flag(args, '--force')
+        ignore_errors, args = pop_flag(args, '--ignore-errors')
+    except ValueError as e:
+        print(f"\nError parsing arguments: {e}")
+        return
 
-    output_dir = "transformed_data"
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    if args and args != ['check']:
+        print("\nInvalid dvg_remap command. Use 'help dvg_remap' for usage information.")
+        return
 
-    dvg_df = self.dvg_file
-    structure_df = self.data["dbstructure.csv"]
+    if self.projection and self.modified and args != ['check']:
+        # Con --columns le uscite sono ricostruite dai file su disco: rename e delete andrebbero persi
+        print("\nUnsaved changes cannot be remapped with --columns: output files are rebuilt from disk "
+              "and would not include them. Restart xhelper without --columns to remap modified data.")
+        return
 
-    # 1.  DCM_name, Question (DVG_NAME) -> DVG_SUBSET_NM
-    col_subset_mapping = {}
-    for _, row in structure_df.iterrows():
-        if pd.notna(row['DVG_SUBSET_NM']):
-            col_subset_mapping[(row['DCM_name'], row['Question'])] = row['DVG_SUBSET_NM']
+    if not self.dvg_base_file_path:
+        print("\nNo DVG base file provided. Restart xhelper with '-dvg <file>'.")
+        return
+    if find_structure_file(self) is None:
+        print(f"\n'{STRUCTURE_FILE}.csv' not found in {self.folder_path}.")
+        return
 
-    # 2. DCM_name, DVG_NAME, DVG_SUBSET, DVG_VALUE -> DVG_LVALUE
-    val_mapping = {}
-    for _, row in dvg_df.iterrows():
-        key = (row['DVG_NAME'], row['DVG_SUBSET_NM'], str(row['DVG_VAL']))
-        val_mapping[key] = row['DVG_LVAL']
+    try:
+        plan = load_plan(self)
+    except Exception as e:
+        print(f"\n✗ Error building DVG plan: {e}")
+        return
 
-    print(col_subset_mapping)
-    print(" ")
-    print(val_mapping)
+    try:
+        remap = plan_remap_columns(self, plan)
+        frames = _read_remap_columns(self, remap)
+        valid = validate_plan(plan, frames)
+    except Exception as e:
+        print(f"\n✗ Error reading columns to remap: {e}")
+        return
+    if args:
+        return
+    if not valid and not ignore_errors:
+        # Valori senza etichetta diventerebbero celle vuote: non scriviamo nulla
+        print("\nValidation failed: no file has been written. "
+              "Fix the unmapped values above or use 'dvg_remap --ignore-errors'.")
+        return
 
-    #Join this maps so that we have:
-    # DCM_NAME, DVG_NAME (colonna), DVG_VAL -> DVG_LVAL
+    output_dir = "transformed_data"
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
 
+    manifest = Manifest(output_dir)
+    if manifest.clean_partials():
+        print("Removed partially written files from an interrupted run.")
+    if self.modified and not force:
+        # Le uscite dipendono dai dati in memoria, non da quelli su disco
+        print("Unsaved changes in memory: every file will be rewritten.")
+        force = True
 
-    for name, df in self.data.items():
-        if name in ['dbstructure.csv', 'dvg.csv']:
+    skipped = 0
+    for name, to_remap in remap.items():
+        output_name = csv_output_name(strip_csv_suffix(name), compress) if compress else name
+        source_path = Path(self.folder_path) / name
+        if not force and manifest.is_up_to_date(output_name, source_path, plan.key):
+            skipped += 1
             continue
 
-        transformed_df = df.copy()
-        # Process each column that needs transformation
-        # Make sure to check also for the name of the DCM
-        for col in transformed_df.columns:
-            if col in col_subset_mapping:
-                print(f"Column {col} in file {name} has been updated")
-                subset = col_subset_mapping[col]
-
-                def map_value(x):
-                    if pd.isna(x):
-                        return x
-                    key_loc = (name, col, subset, str(x))
-                    return val_mapping.get(key_loc)
-
-                transformed_df[col] = transformed_df[col].apply(map_value)
-                output_path = os.path.join(output_dir, name)
-                transformed_df.to_csv(output_path, index=False)
-
-    return
+        columns = _file_columns(plan, name)
+        if self.projection:
+            try:
+                transformed_df = read_csv_passthrough(Path(self.folder_path) / name)
+            except Exception as e:
+                print(f"✗ Error reading {name}: {e}")
+                continue
+        else:
+            transformed_df = self.data[name].copy()
+
+        for col in to_remap:
+            # I codici vengono rimappati dai valori tipizzati (anche quando il resto è testo grezzo)
+            typed = frames[name][col]
+            transformed_df[col] = typed.map(_code_lookup(typed, columns[col])).to_numpy()
+
+        output_path = os.path.join(output_dir, output_name)
+        try:
+            stats = write_csv(transformed_df, manifest.partial_path(output_name), backend=self.writer)
+            manifest.commit(output_name, source_path, plan.key)
+            print(f"✓ Remapped {len(to_remap)} columns in {name} ({stats})")
+        except Exception as e:
+            print(f"✗ Error writing {output_path}: {e}")
+
+    if skipped:
+        print(f"Skipped {skipped} up-to-date files (use 'dvg_remap --force' to rewrite them).")
@@ -8,7 +8,10 @@ import pandas as pd
 
 from xhelper.core.actions import do_files, do_save, do_quit, do_show, do_delete, do_rename, do_convert_sas_to_csv, do_xml_generation
 from xhelper.core.dvg_remap import do_dvg_remap
-from xhelper.utils import load_csv_files, load_csv_file
+from xhelper.core.row_index import do_rows
+from xhelper.core.query import do_query
+from xhelper.utils import (load_csv_files, load_csv_file, column_fingerprint, load_sas_metadata, load_sas_file,
+                           is_sas_file)
 
 
 class ExcelHelper(cmd.Cmd):
@@ -32,18 +35,33 @@ class ExcelHelper(cmd.Cmd):
     modified: bool
     """Flag to check if files have been modified (for save on exit)"""
 
+    writer: str | None
+    """CSV writer backend used by save, convert and dvg_remap (see core.writer)"""
+
+    projection: list[str] | None
+    """Columns the CSV files were loaded with (--columns), or None if every column was loaded"""
+
     sas_files: list[str]
     """List of SAS file names"""
 
+    sas_metadata: dict[str, object]
+    """Mapping of SAS file names to their pyreadstat metadata (columns, labels, types, row count)"""
+
+    sas_data: dict[str, pd.DataFrame]
+    """SAS files whose rows have been read on demand (see get_frame)"""
+
     data: dict[str, pd.DataFrame]
-    """Mapping of file names to their corresponding DataFrames"""
+    """Mapping of CSV file names to their corresponding DataFrames"""
 
     column_locations: dict[str, set[str]]
-    """Mapping of column names to set of files containing that column"""
+    """Mapping of column names to set of files (CSV and SAS) containing that column"""
 
     repeated_columns: set[str]
     """Set of column names that appear in more than one file"""
 
+    column_fingerprints: dict[str, dict[str, str]]
+    """Mapping of column names to {file name: content fingerprint} for every file containing that column"""
+
     # Assign imported methods to class
     do_files = do_files
     do_save = do_save
@@ -54,9 +72,11 @@ class ExcelHelper(cmd.Cmd):
     do_convert = do_convert_sas_to_csv
     do_xml_generation = do_xml_generation
     do_dvg_remap = do_dvg_remap
+    do_rows = do_rows
+    do_query = do_query
 
 
-    def __init__(self, folder_path: str, dvg_base_file_path: str):
+    def __init__(self, folder_path: str, dvg_base_file_path: str, columns=None, writer=None):
         super().__init__()
 
         ## CLASS VARIABLES
@@ -64,29 +84,25 @@ class ExcelHelper(cmd.Cmd):
         self.dvg_file: pd.DataFrame = load_csv_file(dvg_base_file_path)
         self.dvg_base_file_path: str = dvg_base_file_path
         self.modified: bool = False
-        # 1. Carica i file CSV
-        self.data: dict[str,pd.DataFrame] = load_csv_files(folder_path)
-        # 2. Cerca eventuali file SASs
-        self.sas_files = [f for f in os.listdir(self.folder_path) if f.lower().endswith('.sas7bdat')]
+        self.writer: str | None = writer
+        self.projection: list[str] | None = list(columns) if columns else None
+        # 1. Carica i file CSV (solo le colonne richieste, se c'è una proiezione)
+        self.data: dict[str,pd.DataFrame] = load_csv_files(folder_path, columns=self.projection)
+        # 2. Indicizza i file SAS (solo metadati: i dati vengono letti su richiesta)
+        self.sas_files = [f for f in os.listdir(self.folder_path) if is_sas_file(f)]
+        self.sas_metadata = load_sas_metadata(folder_path)
+        self.sas_data = {}
 
         # 3. Se non ci sono né CSV né SAS, esci
         if not self.data and not self.sas_files:
             print(f"\nNo CSV or SAS (.sas7bdat) files found in directory: {self.folder_path}.\nQuitting xhelper...")
             quit()
 
-        # 4. Se ho dei file CSV caricati, proseguo con la mappatura
-        if self.data:
-            self.column_locations: dict[str, set[str]] = self.map_column_locations()
-            self.repeated_columns: set[str] = self.find_repeated_columns()
-            self.show_initial_summary()
-        else:
-            # Caso in cui NON ci siano file CSV ma ci siano file SAS
-            # self.data è vuoto, quindi saltiamo la parte di mappatura e summary
-            self.column_locations = {}
-            self.repeated_columns = set()
-            print(
-                f"\nNo CSV files found, but {len(self.sas_files)} SAS file(s) detected in directory: {self.folder_path}.")
-            print("Use the 'convert' command to convert SAS files to CSV if you wish to load them.\n")
+        # 4. Mappatura delle colonne di CSV e SAS insieme
+        self.column_locations: dict[str, set[str]] = self.map_column_locations()
+        self.repeated_columns: set[str] = self.find_repeated_columns()
+        self.column_fingerprints: dict[str, dict[str, str]] = self.map_column_fingerprints()
+        self.show_initial_summary()
 
     def map_column_locations(self) -> Dict[str, Set[str]]:
         """
@@ -96,11 +112,68 @@ class ExcelHelper(cmd.Cmd):
             Dict[str, Set[str]]: Dizionario {colonna: set di nomi_file}
         """
         locations = defaultdict(set)
-        for filename, df in self.data.items():
-            for col in df.columns:
+        for filename, columns in self.file_columns().items():
+            for col in columns:
                 locations[col].add(filename)
         return locations
 
+    def file_columns(self) -> Dict[str, list]:
+        """
+        Colonne di ogni file, CSV (dai DataFrame caricati) e SAS (dai metadati).
+
+        Returns:
+            Dict[str, list]: Dizionario {nome_file: lista di colonne}
+        """
+        columns = {filename: list(df.columns) for filename, df in self.data.items()}
+        for filename, meta in self.sas_metadata.items():
+            columns[filename] = list(meta.column_names)
+        return columns
+
+    def file_rows(self, filename: str):
+        """Numero di righe di un file (None se un file SAS non lo dichiara nei metadati)."""
+        if filename in self.data:
+            return len(self.data[filename])
+        return self.sas_metadata[filename].number_rows
+
+    def column_label(self, filename: str, column: str):
+        """Etichetta SAS della colonna, se il file è un SAS e la colonna ne ha una."""
+        meta = self.sas_metadata.get(filename)
+        if meta is None:
+            return None
+        return meta.column_names_to_labels.get(column) or None
+
+    def get_frame(self, filename: str, columns=None) -> pd.DataFrame:
+        """
+        DataFrame di un file. I file SAS vengono letti solo ora: per intero (e tenuti
+        in memoria) se columns è None, altrimenti solo le colonne richieste.
+        """
+        if filename in self.data:
+            df = self.data[filename]
+            return df if columns is None else df[list(columns)]
+        if filename in self.sas_data:
+            df = self.sas_data[filename]
+            return df if columns is None else df[list(columns)]
+
+        path = os.path.join(self.folder_path, filename)
+        if columns is not None:
+            return load_sas_file(path, usecols=list(columns))
+        df = load_sas_file(path)
+        self.sas_data[filename] = df
+        return df
+
+    def map_column_fingerprints(self) -> Dict[str, Dict[str, str]]:
+        """
+        Calcola l'impronta del contenuto di ogni colonna di ogni file.
+
+        Returns:
+            Dict[str, Dict[str, str]]: Dizionario {colonna: {nome_file: impronta}}
+        """
+        fingerprints = defaultdict(dict)
+        for filename, df in self.data.items():
+            for col in df.columns:
+                fingerprints[col][filename] = column_fingerprint(df[col])
+        return fingerprints
+
     def find_repeated_columns(self) -> Set[str]:
         """
         Trova le colonne che appaiono in più di un file.
@@ -116,6 +189,8 @@ class ExcelHelper(cmd.Cmd):
     def show_initial_summary(self):
         """Mostra un riepilogo iniziale dei file caricati e delle colonne ripetute."""
         print(f"\nLoaded {len(self.data)} files from: {self.folder_path}")
+        if self.sas_metadata:
+            print(f"Indexed {len(self.sas_metadata)} SAS files (rows are read on demand)")
         print(f"Found {len(self.repeated_columns)} columns that appear in multiple files:")
 
     def show_repeated_columns(self):
@@ -135,6 +210,37 @@ class ExcelHelper(cmd.Cmd):
             for file in files:
                 print(f"  - {file}")
 
+    def show_duplicate_columns(self):
+        """Visualizza i gruppi di colonne con contenuto identico (anche con nomi diversi o in file diversi)."""
+        groups = defaultdict(list)
+        empty = 0
+        for column, files in self.column_fingerprints.items():
+            for file, fingerprint in files.items():
+                # Colonne vuote o tutte mancanti hanno la stessa impronta ma non sono duplicati utili
+                if self.data[file][column].isna().all():
+                    empty += 1
+                    continue
+                groups[fingerprint].append((file, column))
+        if empty:
+            print(f"\nIgnored {empty} empty or all-missing columns.")
+
+        duplicates = sorted(
+            (sorted(members) for members in groups.values() if len(members) > 1),
+            key=len,
+            reverse=True
+        )
+        if not duplicates:
+            print("\nNo identical columns found.")
+            return
+
+        print(f"\nFound {len(duplicates)} groups of identical columns:")
+        for members in duplicates:
+            names = {column for _, column in members}
+            label = f"'{members[0][1]}'" if len(names) == 1 else "different names"
+            print(f"\n{len(members)} identical columns ({label}):")
+            for file, column in members:
+                print(f"  - {file}: '{column}'")
+
     def show_all_columns(self):
         """Visualizza tutte le colonne di tutti i file e la relativa frequenza."""
         sorted_cols = sorted(
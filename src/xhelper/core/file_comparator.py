@@ -1,15 +1,52 @@
 import pandas as pd
 import os
+import csv
+import json
+import math
+import datetime
+from collections import defaultdict
+from dataclasses import dataclass, field
 from pathlib import Path
-from xhelper.utils import _write_txt_report
+from xhelper.utils import _write_txt_report, column_fingerprint, is_csv_file, is_sas_file, strip_csv_suffix
+from xhelper.core.projection import read_file_header, read_file_columns
 # ---------------------------------------------------------
 #                  FUNZIONE DI CONFRONTO
 # ---------------------------------------------------------
 
 
-def compare_folders(folder1: str, folder2: str):
+def _logical_files(folder: str) -> dict[str, list[str]]:
+    """{nome logico: file della cartella che lo rappresentano}, in ordine alfabetico."""
+    logical = defaultdict(list)
+    for f in sorted(os.listdir(folder)):
+        if is_csv_file(f):
+            logical[strip_csv_suffix(f) + '.csv'].append(f)
+        elif is_sas_file(f):
+            logical[f].append(f)
+    return logical
+
+
+def _folder_files(folder: str) -> dict[str, str]:
+    """
+    File confrontabili di una cartella: {nome logico: nome file}.
+    'AE.csv' e 'AE.csv.gz' sono lo stesso file logico; i SAS si confrontano con i SAS omonimi.
+    Se una cartella li contiene entrambi si usa il primo in ordine alfabetico
+    (il CSV in chiaro): vedi _collision_lines per segnalarlo nel report.
     """
-    Confronta i file .csv presenti in due cartelle e:
+    return {name: files[0] for name, files in _logical_files(folder).items()}
+
+
+def _collision_lines(folder: str) -> list[str]:
+    """Righe di report per i file logici presenti in più versioni nella stessa cartella."""
+    lines = []
+    for name, files in sorted(_logical_files(folder).items()):
+        if len(files) > 1:
+            lines.append(f"  - {folder}: {name} has {len(files)} versions {files}, comparing '{files[0]}' only")
+    return lines
+
+
+def compare_folders(folder1: str, folder2: str, columns=None):
+    """
+    Confronta i file .csv (e .sas7bdat) presenti in due cartelle e:
       - Stampa a schermo eventuali differenze
       - Salva un file di testo ben formattato con sezioni e titoli ASCII.
 
@@ -19,6 +56,9 @@ def compare_folders(folder1: str, folder2: str):
       3) Mismatch di dtype.
       4) Se entrambi numeric, differenza di media (mean).
       5) Differenza nel numero di valori unici (unique).
+
+    Se columns è indicato, il confronto (e la lettura dei file) si limita a quelle colonne.
+    Le colonne presenti in una sola cartella non vengono mai lette: bastano le intestazioni.
     """
 
     # Lista in cui accumuliamo le stringhe di output
@@ -39,9 +79,16 @@ def compare_folders(folder1: str, folder2: str):
         _write_txt_report(output_lines)
         return
 
-    # 2) Raccolta file .csv
-    files_in_1 = {f for f in os.listdir(folder1) if f.lower().endswith('.csv')}
-    files_in_2 = {f for f in os.listdir(folder2) if f.lower().endswith('.csv')}
+    # 2) Raccolta file .csv (anche compressi) e .sas7bdat
+    paths_1 = _folder_files(folder1)
+    paths_2 = _folder_files(folder2)
+    collisions = _collision_lines(folder1) + _collision_lines(folder2)
+    if collisions:
+        output_lines.append("[DUPLICATE FILES]")
+        output_lines.extend(collisions)
+        output_lines.append("")
+    files_in_1 = set(paths_1)
+    files_in_2 = set(paths_2)
 
     shared = sorted(files_in_1 & files_in_2)
     only_in_1 = sorted(files_in_1 - files_in_2)
@@ -56,13 +103,24 @@ def compare_folders(folder1: str, folder2: str):
 
     # 4) Confronto dettagliato dei file comuni
     for filename in shared:
-        path1 = Path(folder1) / filename
-        path2 = Path(folder2) / filename
+        path1 = Path(folder1) / paths_1[filename]
+        path2 = Path(folder2) / paths_2[filename]
 
         try:
-            # low_memory=False per caricare tutto in memoria e ridurre DtypeWarning
-            df1 = pd.read_csv(path1, low_memory=False)
-            df2 = pd.read_csv(path2, low_memory=False)
+            # Prima le sole intestazioni: servono per sapere quali colonne leggere
+            header1 = read_file_header(path1)
+            header2 = read_file_header(path2)
+            cols_1 = set(header1)
+            cols_2 = set(header2)
+            if columns:
+                cols_1 &= set(columns)
+                cols_2 &= set(columns)
+            common_cols = sorted(cols_1 & cols_2)
+
+            # low_memory=False per caricare tutto in memoria e ridurre DtypeWarning.
+            # Senza colonne comuni basta la prima colonna per contare le righe.
+            df1 = read_file_columns(path1, common_cols or header1[:1], low_memory=False)
+            df2 = read_file_columns(path2, common_cols or header2[:1], low_memory=False)
         except Exception as e:
             output_lines.append(f"--- FILE '{filename}' ---")
             output_lines.append(f"  [ERRORE LETTURA] {e}")
@@ -71,11 +129,8 @@ def compare_folders(folder1: str, folder2: str):
 
         differences = []
 
-        cols_1 = set(df1.columns)
-        cols_2 = set(df2.columns)
         only_in_1_cols = sorted(cols_1 - cols_2)
         only_in_2_cols = sorted(cols_2 - cols_1)
-        common_cols = sorted(cols_1 & cols_2)
 
         # 4.a) Colonne solo in una cartella
         if only_in_1_cols or only_in_2_cols:
@@ -110,6 +165,11 @@ def compare_folders(folder1: str, folder2: str):
                 )
                 continue  # Se il dtype differisce, salto i confronti su media e unique
 
+            # Colonne float identiche: due impronte costano molto meno di nunique su valori
+            # quasi tutti distinti. Per interi e testo nunique è già più veloce dell'hash.
+            if pd.api.types.is_float_dtype(dtype1) and column_fingerprint(df1[col]) == column_fingerprint(df2[col]):
+                continue
+
             # c2) Se numerica, differenza di media
             if pd.api.types.is_numeric_dtype(dtype1):
                 mean1 = df1[col].mean(skipna=True)
@@ -157,3 +217,215 @@ def compare_folders(folder1: str, folder2: str):
     _write_txt_report(output_lines)
     # E stampiamo anche a schermo
     print("\n".join(output_lines))
+
+
+# ---------------------------------------------------------
+#            CONFRONTO N-WAY (BASELINE / SNAPSHOT)
+# ---------------------------------------------------------
+
+
+@dataclass
+class ColumnStats:
+    """Statistiche di una colonna usate nei confronti."""
+    dtype: str
+    mean: float | None
+    nunique: int
+    fingerprint: str
+
+
+@dataclass
+class FileStats:
+    """Statistiche di un file: numero di righe e statistiche per colonna."""
+    rows: int
+    columns: dict[str, ColumnStats] = field(default_factory=dict)
+
+
+def _column_stats(series: pd.Series, fingerprint: str) -> ColumnStats:
+    mean = None
+    if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+        mean = float(series.mean(skipna=True))
+    return ColumnStats(str(series.dtype), mean, int(series.nunique(dropna=False)), fingerprint)
+
+
+def compute_folder_stats(folder: str, columns=None, reference=None) -> dict[str, FileStats]:
+    """
+    Calcola una sola volta le statistiche di tutti i file di una cartella.
+
+    Args:
+        columns: se indicato, legge e confronta solo queste colonne.
+        reference: statistiche di un'altra cartella (es. la baseline); le colonne
+                   con la stessa impronta ne riusano media e unique senza ricalcolarli.
+
+    Returns:
+        dict[str, FileStats]: {nome logico del file: statistiche}
+    """
+    stats = {}
+    for logical, filename in sorted(_folder_files(folder).items()):
+        path = Path(folder) / filename
+        try:
+            header = read_file_header(path)
+            wanted = [c for c in header if c in set(columns)] if columns else header
+            df = read_file_columns(path, wanted or header[:1], low_memory=False)
+        except Exception as e:
+            print(f"✗ Error reading {path}: {e}")
+            continue
+
+        ref_columns = reference[logical].columns if reference and logical in reference else {}
+        file_stats = FileStats(rows=len(df))
+        for col in wanted:
+            fingerprint = column_fingerprint(df[col])
+            ref = ref_columns.get(col)
+            if ref is not None and ref.fingerprint == fingerprint:
+                file_stats.columns[col] = ref
+            else:
+                file_stats.columns[col] = _column_stats(df[col], fingerprint)
+        stats[logical] = file_stats
+    return stats
+
+
+def _same(a, b) -> bool:
+    if isinstance(a, float) and isinstance(b, float):
+        return (math.isnan(a) and math.isnan(b)) or abs(a - b) <= 1e-9
+    return a == b
+
+
+def _drifts(values: list) -> bool:
+    """True se i valori presenti (None = file o colonna assente) non sono tutti uguali."""
+    present = [v for v in values if v is not None]
+    return any(not _same(v, present[0]) for v in present)
+
+
+def _fmt(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+def _fmt_delta(value, previous) -> str:
+    """Valore con la differenza rispetto al termine di paragone, se numerica."""
+    text = _fmt(value)
+    if _same(value, previous) or value is None or previous is None or isinstance(value, str):
+        return text
+    if (isinstance(value, float) and math.isnan(value)) or (isinstance(previous, float) and math.isnan(previous)):
+        return text  # Media non definita (colonna vuota): nessuna differenza da mostrare
+    delta = value - previous
+    return f"{text} ({delta:+.3f})" if isinstance(delta, float) else f"{text} ({delta:+d})"
+
+
+def build_drift_matrix(snapshots: list[str], stats: dict[str, dict[str, FileStats]]) -> list[dict]:
+    """
+    Matrice delle sole metriche che cambiano tra gli snapshot.
+
+    Returns:
+        list[dict]: righe {'file', 'column', 'metric', 'values': [valore per snapshot]}
+                    (column è '' per il numero di righe; None se il file/colonna manca).
+    """
+    matrix = []
+    all_files = sorted(set().union(*(stats[s].keys() for s in snapshots)))
+    for filename in all_files:
+        per_snapshot = [stats[s].get(filename) for s in snapshots]
+        values = [f.rows if f else None for f in per_snapshot]
+        # Un file assente in qualche snapshot compare come riga 'rows' con '-'
+        if _drifts(values) or None in values:
+            matrix.append({'file': filename, 'column': '', 'metric': 'rows', 'values': values})
+
+        present_files = [f for f in per_snapshot if f]
+        all_columns = sorted(set().union(*(f.columns.keys() for f in present_files)))
+        for col in all_columns:
+            col_stats = [f.columns.get(col) if f else None for f in per_snapshot]
+            fingerprints = {c.fingerprint if c else None for f, c in zip(per_snapshot, col_stats) if f}
+            if len(fingerprints) == 1:
+                continue  # Colonna identica (o assente) in tutti gli snapshot che hanno il file
+            # Colonna aggiunta o rimossa: compare come riga 'dtype' con '-'
+            presence_differs = None in fingerprints
+            for metric in ('dtype', 'mean', 'nunique'):
+                values = [getattr(c, metric) if c else None for c in col_stats]
+                if _drifts(values) or (metric == 'dtype' and presence_differs):
+                    matrix.append({'file': filename, 'column': col, 'metric': metric, 'values': values})
+    return matrix
+
+
+def _json_value(value):
+    # JSON non ha NaN: una media non definita diventa null
+    return None if isinstance(value, float) and math.isnan(value) else value
+
+
+def _write_matrix_reports(snapshots: list[str], matrix: list[dict], timestamp: str):
+    """Salva la matrice anche in CSV e JSON, per elaborazioni automatiche."""
+    csv_name = f"compare_matrix_{timestamp}.csv"
+    json_name = f"compare_matrix_{timestamp}.json"
+    try:
+        with open(csv_name, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["File", "Column", "Metric", *snapshots])
+            for row in matrix:
+                writer.writerow([row['file'], row['column'], row['metric'], *("" if v is None else v for v in row['values'])])
+        drift = [{**row, 'values': [_json_value(v) for v in row['values']]} for row in matrix]
+        with open(json_name, "w", encoding="utf-8") as f:
+            json.dump({'baseline': snapshots[0], 'snapshots': snapshots, 'drift': drift}, f, indent=1,
+                      allow_nan=False)
+        print(f"Matrix also saved to '{csv_name}' and '{json_name}'")
+    except Exception as e:
+        print(f"Error writing matrix reports: {e}")
+
+
+def compare_snapshots(baseline: str, folders: list[str], columns=None, rolling: bool = False):
+    """
+    Confronta una baseline con più cartelle (nuove consegne o snapshot successivi).
+
+    Le statistiche di ogni cartella (righe per file; dtype, media, unique e impronta
+    per colonna) vengono calcolate una sola volta e riusate in tutti i confronti.
+    Il report è una matrice file/colonna/metrica x snapshot con le sole metriche che
+    cambiano; le differenze sono rispetto alla baseline o, con rolling=True,
+    rispetto allo snapshot precedente.
+    """
+    snapshots = [baseline, *folders]
+    invalid = [f for f in snapshots if not os.path.isdir(f)]
+    if invalid:
+        print(f"ERRORE: cartelle non valide: {invalid}")
+        return
+
+    stats = {}
+    for folder in snapshots:
+        print(f"Computing statistics for {folder}...")
+        stats[folder] = compute_folder_stats(folder, columns=columns, reference=stats.get(baseline))
+    matrix = build_drift_matrix(snapshots, stats)
+
+    output_lines = []
+    output_lines.append("======================================================================")
+    output_lines.append("                  CSV SNAPSHOT COMPARISON REPORT                      ")
+    output_lines.append("======================================================================")
+    output_lines.append(f"Baseline: {baseline}")
+    for i, folder in enumerate(folders, start=1):
+        output_lines.append(f"Snapshot {i}: {folder}")
+    output_lines.append(f"Differences relative to: {'previous snapshot' if rolling else 'baseline'}")
+    output_lines.append("")
+
+    collisions = [line for folder in snapshots for line in _collision_lines(folder)]
+    if collisions:
+        output_lines.append("[DUPLICATE FILES]")
+        output_lines.extend(collisions)
+        output_lines.append("")
+
+    if not matrix:
+        output_lines.append("No differences found.")
+
+    current_file = None
+    for row in matrix:
+        if row['file'] != current_file:
+            current_file = row['file']
+            output_lines.append(f"--- FILE '{current_file}' ---")
+        values = row['values']
+        cells = [_fmt(values[0])]
+        for i in range(1, len(values)):
+            previous = values[i - 1] if rolling else values[0]
+            cells.append(_fmt_delta(values[i], previous))
+        label = f"[{row['metric'].upper()}]" if not row['column'] else f"'{row['column']}' {row['metric']}"
+        output_lines.append(f"  {label}: " + " | ".join(cells))
+
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    _write_txt_report(output_lines, timestamp)
+    _write_matrix_reports(snapshots, matrix, timestamp)
+    print("\n".join(output_lines))
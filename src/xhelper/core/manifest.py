@@ -0,0 +1,96 @@
+import json
+import os
+from pathlib import Path
+
+from xhelper.utils import hash_files
+
+MANIFEST_FILE = ".xhelper_manifest.json"
+"""Manifest salvato nella cartella di output di convert e dvg_remap"""
+
+PARTIAL_PREFIX = ".partial."
+"""Prefisso dei file in scrittura: diventano definitivi solo a scrittura completata"""
+
+
+class Manifest:
+    """
+    Registro delle uscite di convert/dvg_remap in una cartella di output, per
+    rieseguire solo quello che è cambiato (stile make).
+
+    Per ogni file di output salva dimensione, mtime e SHA-256 della sorgente,
+    l'hash del piano DVG usato (se c'è) e dimensione/mtime dell'output scritto.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = Path(output_dir)
+        self.path = self.output_dir / MANIFEST_FILE
+        self.entries: dict[str, dict] = {}
+        if self.path.exists():
+            try:
+                with open(self.path, encoding='utf-8') as fh:
+                    self.entries = json.load(fh)
+            except (OSError, ValueError):
+                print(f"Warning: unreadable manifest {self.path}, every output will be rebuilt.")
+
+    def partial_path(self, output_name: str) -> Path:
+        """Percorso temporaneo su cui scrivere output_name (stessa estensione, quindi stessa compressione)."""
+        return self.output_dir / f"{PARTIAL_PREFIX}{output_name}"
+
+    def clean_partials(self) -> int:
+        """Rimuove i file lasciati a metà da un'esecuzione interrotta."""
+        removed = 0
+        for leftover in self.output_dir.glob(f"{PARTIAL_PREFIX}*"):
+            leftover.unlink()
+            removed += 1
+        return removed
+
+    def is_up_to_date(self, output_name: str, source_path, plan_hash=None) -> bool:
+        """
+        True se output_name esiste, è quello registrato (non troncato né modificato)
+        ed è stato prodotto dalla stessa sorgente con lo stesso piano.
+        """
+        entry = self.entries.get(output_name)
+        output_path = self.output_dir / output_name
+        if entry is None or not output_path.exists() or entry.get('plan_hash') != plan_hash:
+            return False
+
+        output_stat = output_path.stat()
+        if (output_stat.st_size, output_stat.st_mtime_ns) != (entry['output_size'], entry['output_mtime_ns']):
+            return False
+
+        source_stat = os.stat(source_path)
+        if source_stat.st_size != entry['source_size']:
+            return False
+        if source_stat.st_mtime_ns == entry['source_mtime_ns']:
+            return True
+
+        # Solo l'mtime è cambiato (es. file ricopiato): decide il contenuto
+        if hash_files(source_path) != entry['source_sha256']:
+            return False
+        entry['source_mtime_ns'] = source_stat.st_mtime_ns
+        self.save()
+        return True
+
+    def commit(self, output_name: str, source_path, plan_hash=None):
+        """Rende definitivo l'output scritto su partial_path e lo registra nel manifest."""
+        output_path = self.output_dir / output_name
+        os.replace(self.partial_path(output_name), output_path)
+
+        source_stat = os.stat(source_path)
+        output_stat = output_path.stat()
+        self.entries[output_name] = {
+            'source': str(source_path),
+            'source_size': source_stat.st_size,
+            'source_mtime_ns': source_stat.st_mtime_ns,
+            'source_sha256': hash_files(source_path),
+            'plan_hash': plan_hash,
+            'output_size': output_stat.st_size,
+            'output_mtime_ns': output_stat.st_mtime_ns,
+        }
+        # Salviamo dopo ogni file: un'esecuzione interrotta riparte da qui
+        self.save()
+
+    def save(self):
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump(self.entries, fh, indent=1)
+        os.replace(tmp_path, self.path)
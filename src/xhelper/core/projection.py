@@ -0,0 +1,72 @@
+from collections import defaultdict
+from pathlib import Path
+
+import pandas as pd
+
+from xhelper.utils import is_sas_file, load_sas_file, read_sas_header
+
+
+def read_csv_header(file_path) -> list[str]:
+    """Legge solo la riga di intestazione di un CSV (anche compresso)."""
+    return pd.read_csv(file_path, nrows=0).columns.tolist()
+
+
+def read_file_header(file_path) -> list[str]:
+    """Colonne di un CSV o di un .sas7bdat, senza leggerne i dati."""
+    if is_sas_file(file_path):
+        return read_sas_header(file_path)
+    return read_csv_header(file_path)
+
+
+def read_file_columns(file_path, usecols, **read_csv_kwargs) -> pd.DataFrame:
+    """Legge solo le colonne usecols di un CSV o di un .sas7bdat."""
+    if is_sas_file(file_path):
+        return load_sas_file(file_path, usecols=list(usecols))
+    return pd.read_csv(file_path, usecols=usecols, **read_csv_kwargs)
+
+
+def map_header_locations(headers: dict[str, list[str]]) -> dict[str, set[str]]:
+    """Come ExcelHelper.map_column_locations, ma partendo dalle sole intestazioni."""
+    locations = defaultdict(set)
+    for filename, columns in headers.items():
+        for col in columns:
+            locations[col].add(filename)
+    return locations
+
+
+def plan_projection(column_locations: dict[str, set[str]], columns) -> dict[str, list[str]]:
+    """
+    Calcola le colonne da leggere per ogni file.
+
+    Args:
+        column_locations: {colonna: set di file che la contengono}
+        columns: colonne richieste dal comando
+
+    Returns:
+        dict[str, list[str]]: {nome_file: colonne da passare come usecols};
+                              i file senza nessuna colonna richiesta non compaiono.
+    """
+    plan = defaultdict(list)
+    for col in dict.fromkeys(columns):
+        for filename in column_locations.get(col, ()):
+            plan[filename].append(col)
+    return dict(plan)
+
+
+def read_csv_passthrough(file_path) -> pd.DataFrame:
+    """
+    Legge un CSV lasciando ogni campo come testo grezzo (niente inferenza di tipo né NaN),
+    così le colonne non toccate vengono riscritte esattamente come erano.
+    """
+    return pd.read_csv(file_path, dtype=str, keep_default_na=False, na_filter=False)
+
+
+def projected_folder_headers(folder_path, filenames) -> dict[str, list[str]]:
+    """Intestazioni dei file indicati, ignorando (con un messaggio) quelli illeggibili."""
+    headers = {}
+    for filename in filenames:
+        try:
+            headers[filename] = read_csv_header(Path(folder_path) / filename)
+        except Exception as e:
+            print(f"✗ Error reading header of {filename}: {e}")
+    return headers
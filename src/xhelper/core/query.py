@@ -0,0 +1,135 @@
+import os
+import re
+import shlex
+from pathlib import Path
+
+from xhelper.utils import is_csv_file, strip_csv_suffix
+
+
+def table_name(filename: str) -> str:
+    """Nome della tabella SQL per un file: 'AE-2024.csv.gz' -> 'AE_2024'."""
+    return re.sub(r'\W', '_', strip_csv_suffix(filename))
+
+
+UNSUPPORTED_COMPRESSIONS = ('.bz2', '.xz')
+"""Compressioni che DuckDB non sa leggere: questi file non diventano tabelle"""
+
+
+def _sql_literal(text: str) -> str:
+    return "'" + str(text).replace("'", "''") + "'"
+
+
+def connect_folder(folder_path):
+    """
+    Apre una connessione DuckDB in memoria con una vista per ogni CSV della cartella.
+    Le viste leggono direttamente da disco: DuckDB applica proiezione e filtri
+    durante la scansione, senza caricare i file in pandas.
+
+    Returns:
+        tuple: (connessione, {nome_tabella: nome_file}, [(nome_file, motivo) dei file saltati])
+    """
+    import duckdb  # Dipendenza opzionale (pip install xhelper[query])
+
+    con = duckdb.connect()
+    tables = {}
+    skipped = []
+    for filename in sorted(os.listdir(folder_path)):
+        if not is_csv_file(filename):
+            continue
+        if filename.lower().endswith(UNSUPPORTED_COMPRESSIONS):
+            skipped.append((filename, "compression not supported by DuckDB"))
+            continue
+
+        # Nomi che collidono ('AE-1.csv' e 'AE_1.csv', 'AE.csv' e 'AE.csv.gz') ricevono un suffisso
+        base = table_name(filename)
+        name = base
+        suffix = 2
+        while name.lower() in (t.lower() for t in tables):
+            name = f"{base}_{suffix}"
+            suffix += 1
+
+        path = Path(folder_path) / filename
+        try:
+            con.execute(f'CREATE VIEW "{name}" AS SELECT * FROM read_csv_auto({_sql_literal(path)})')
+        except Exception as e:
+            skipped.append((filename, str(e).splitlines()[0]))
+            continue
+        tables[name] = filename
+    return con, tables, skipped
+
+
+def do_query(self: "ExcelHelper", arg):
+    """
+    Run SQL against the CSV files of the folder, read straight from disk (requires duckdb).
+    Every file is a table named after the file without extension, e.g. AE.csv -> AE.
+
+    Usage:
+        query tables                       - List the available tables
+        query SELECT ...                   - Run the query and print the result
+        query --out 'file' SELECT ...      - Write the result to file (.csv, .csv.gz, .parquet, ...)
+
+    Example:
+        query SELECT SUBJ, count(*) FROM AE WHERE AEOUT = 4 GROUP BY SUBJ HAVING count(*) > 1
+
+    The same queries run without loading the folder with: xhelper -f folder --query "SELECT ..."
+    """
+    run_query(self.folder_path, arg)
+
+
+def run_query(folder_path, arg) -> bool:
+    """
+    Esegue un comando 'query' direttamente sui file della cartella, senza ExcelHelper
+    (nessun DataFrame caricato in memoria). Ritorna False in caso di errore.
+    """
+    sql = arg.strip()
+    output_path = None
+    if sql.startswith('--out'):
+        # Solo il percorso passa da shlex: il resto è SQL e va lasciato intatto
+        lexer = shlex.shlex(sql[len('--out'):], posix=True)
+        lexer.whitespace_split = True
+        try:
+            output_path = lexer.get_token()
+        except ValueError as e:
+            print(f"\nError parsing arguments: {e}")
+            return False
+        sql = lexer.instream.read().strip()
+        if not output_path or not sql:
+            print("\nUsage: query --out 'file' SELECT ...")
+            return False
+
+    if not sql:
+        print("\nPlease use command 'help query' for usage information")
+        return False
+
+    try:
+        con, tables, skipped = connect_folder(folder_path)
+    except ImportError:
+        print("\nThe 'query' command requires duckdb. Install it with: pip install duckdb")
+        return False
+    except Exception as e:
+        print(f"\n✗ Error opening DuckDB: {e}")
+        return False
+
+    if skipped:
+        print(f"\nSkipped {len(skipped)} files that cannot be queried:")
+        for filename, reason in skipped:
+            print(f"  - {filename}: {reason}")
+
+    try:
+        if sql == 'tables':
+            print(f"\n{len(tables)} tables available:")
+            for name, filename in tables.items():
+                print(f"  - {name} ({filename})")
+        elif output_path:
+            # DuckDB sceglie il formato dall'estensione; HEADER esiste solo per i CSV
+            options = " (HEADER)" if is_csv_file(output_path) else ""
+            con.execute(f"COPY ({sql}) TO {_sql_literal(output_path)}{options}")
+            print(f"\nQuery result saved to '{output_path}'")
+        else:
+            print(con.sql(sql))
+    except Exception as e:
+        print(f"\n✗ Query error: {e}")
+        return False
+    finally:
+        con.close()
+    return True
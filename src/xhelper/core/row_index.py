@@ -0,0 +1,264 @@
+import io
+import mmap
+import os
+import random
+import shlex
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from xhelper.utils import get_cache_dir
+
+SCAN_BLOCK_SIZE = 64 * 1024 * 1024
+"""Byte analizzati per blocco durante la scansione dei fine riga"""
+
+_QUOTE = ord('"')
+_NEWLINE = ord('\n')
+
+
+@dataclass
+class RowIndex:
+    """
+    Indice dei confini di riga di un file CSV.
+
+    offsets[i] è il byte di inizio del record i (il record 0 è l'header),
+    l'ultimo elemento è la dimensione del file (sentinella).
+    """
+    file_path: Path
+    offsets: np.ndarray
+
+    @property
+    def n_rows(self) -> int:
+        """Numero di righe dati (header escluso)."""
+        return max(len(self.offsets) - 2, 0)
+
+    def byte_range(self, start: int, stop: int) -> tuple[int, int]:
+        """Intervallo di byte [inizio, fine) che contiene le righe dati start..stop-1."""
+        start = min(max(start, 0), self.n_rows)
+        stop = min(max(stop, start), self.n_rows)
+        return int(self.offsets[start + 1]), int(self.offsets[stop + 1])
+
+
+def scan_row_offsets(file_path) -> np.ndarray:
+    """
+    Calcola gli offset di inizio riga con una scansione vettoriale del file mappato in memoria.
+
+    Un '\\n' è un confine di riga solo se il numero di virgolette che lo precedono è pari,
+    così i campi tra virgolette che contengono a capo non spezzano il record
+    (le virgolette di escape "" contano due e non alterano la parità).
+    """
+    size = os.path.getsize(file_path)
+    if size == 0:
+        return np.zeros(1, dtype=np.int64)
+
+    chunks = [np.zeros(1, dtype=np.int64)]
+    in_quotes = 0
+    with open(file_path, 'rb') as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for block_start in range(0, size, SCAN_BLOCK_SIZE):
+            count = min(SCAN_BLOCK_SIZE, size - block_start)
+            block = np.frombuffer(mm, dtype=np.uint8, count=count, offset=block_start)
+            quotes = np.flatnonzero(block == _QUOTE)
+            newlines = np.flatnonzero(block == _NEWLINE)
+            # Il buffer deve essere rilasciato prima della chiusura del mmap
+            del block
+
+            quotes_before = np.searchsorted(quotes, newlines) + in_quotes
+            boundaries = newlines[quotes_before % 2 == 0]
+            chunks.append(boundaries.astype(np.int64) + block_start + 1)
+            in_quotes = (in_quotes + len(quotes)) % 2
+
+    offsets = np.concatenate(chunks)
+    if offsets[-1] != size:
+        offsets = np.append(offsets, np.int64(size))
+    return offsets
+
+
+def _index_cache_path(file_path: Path):
+    cache_dir = get_cache_dir(file_path.parent)
+    return cache_dir / f"{file_path.name}.rowidx.npz" if cache_dir else None
+
+
+def get_row_index(file_path) -> RowIndex:
+    """
+    Ritorna l'indice delle righe di file_path, usando la cache su disco
+    se dimensione e mtime del file non sono cambiati.
+    """
+    file_path = Path(file_path)
+    stat = file_path.stat()
+    cache_path = _index_cache_path(file_path)
+
+    if cache_path and cache_path.exists():
+        try:
+            with np.load(cache_path) as cached:
+                if int(cached['size']) == stat.st_size and int(cached['mtime_ns']) == stat.st_mtime_ns:
+                    return RowIndex(file_path, cached['offsets'])
+        except Exception:
+            pass  # Cache corrotta o di un formato vecchio: la ricostruiamo
+
+    offsets = scan_row_offsets(file_path)
+    if cache_path is None:
+        return RowIndex(file_path, offsets)
+    try:
+        np.savez(cache_path, offsets=offsets, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+    except OSError as e:
+        print(f"Warning: could not cache row index for {file_path.name}: {e}")
+    return RowIndex(file_path, offsets)
+
+
+def _read_segments(file_path, header_len: int, segments: list[tuple[int, int]], **read_csv_kwargs) -> pd.DataFrame:
+    """Legge l'header (i primi header_len byte) più i segmenti indicati e li interpreta come un unico CSV."""
+    buffer = io.BytesIO()
+    with open(file_path, 'rb') as fh:
+        buffer.write(fh.read(header_len))
+        for begin, end in segments:
+            fh.seek(begin)
+            chunk = fh.read(end - begin)
+            buffer.write(chunk)
+            if chunk and not chunk.endswith(b'\n'):
+                buffer.write(b'\n')
+    buffer.seek(0)
+    return pd.read_csv(buffer, **read_csv_kwargs)
+
+
+def _read_indexed_rows(index: RowIndex, segments: list[tuple[int, int]], expected: int,
+                       read_csv_kwargs: dict) -> pd.DataFrame:
+    """
+    Legge i segmenti come righe dell'indice: le righe vuote contano come righe
+    (l'indice le conta), quindi non vanno saltate da read_csv.
+    """
+    df = _read_segments(index.file_path, int(index.offsets[1]), segments,
+                        **{'skip_blank_lines': False, **read_csv_kwargs})
+    if len(df) != expected:
+        raise ValueError(f"expected {expected} rows from the row index, read {len(df)}")
+    return df
+
+
+def read_rows(file_path, start: int, stop: int, **read_csv_kwargs) -> pd.DataFrame:
+    """Legge solo le righe dati start..stop-1 senza scorrere il resto del file."""
+    index = get_row_index(file_path)
+    start = min(max(start, 0), index.n_rows)
+    stop = min(max(stop, start), index.n_rows)
+    df = _read_indexed_rows(index, [index.byte_range(start, stop)], stop - start, read_csv_kwargs)
+    df.index = pd.RangeIndex(start, stop)
+    return df
+
+
+def sample_rows(file_path, k: int, seed=None, **read_csv_kwargs) -> pd.DataFrame:
+    """Campione uniforme (senza ripetizioni) di k righe dati, in ordine di file."""
+    index = get_row_index(file_path)
+    rows = sorted(random.Random(seed).sample(range(index.n_rows), min(k, index.n_rows)))
+    df = _read_indexed_rows(index, [index.byte_range(r, r + 1) for r in rows], len(rows), read_csv_kwargs)
+    df.index = pd.Index(rows)
+    return df
+
+
+def _parse_byte_range(file_path, header_len: int, begin: int, end: int, read_csv_kwargs: dict) -> pd.DataFrame:
+    # Eseguita nei processi worker: deve restare a livello di modulo per essere serializzabile.
+    # Riceve la lunghezza dell'header invece di ricaricare l'indice completo delle righe.
+    return _read_segments(file_path, header_len, [(begin, end)], **read_csv_kwargs)
+
+
+def _conflicting_columns(parts: list[pd.DataFrame]) -> list[str]:
+    """
+    Colonne a cui i worker hanno assegnato tipi diversi (es. numeri in un intervallo,
+    testo in un altro). Interi e float non contano: pd.concat li promuove a float
+    come farebbe una lettura unica.
+    """
+    conflicts = []
+    for col in parts[0].columns:
+        dtypes = {part[col].dtype for part in parts}
+        if len(dtypes) > 1 and not all(pd.api.types.is_numeric_dtype(d) and not pd.api.types.is_bool_dtype(d)
+                                       for d in dtypes):
+            conflicts.append(col)
+    return conflicts
+
+
+def read_csv_parallel(file_path, workers=None, **read_csv_kwargs) -> pd.DataFrame:
+    """
+    Legge un singolo CSV su più processi: il file viene diviso in intervalli di byte
+    allineati ai confini di riga, ogni worker ne interpreta uno e i risultati
+    vengono concatenati nell'ordine originale.
+
+    Ogni worker inferisce i tipi solo sul proprio intervallo: le colonne su cui i
+    worker non concordano vengono rilette per intero, così il risultato ha gli
+    stessi tipi di pd.read_csv sull'intero file.
+    """
+    index = get_row_index(file_path)
+    workers = workers or os.cpu_count() or 1
+    data_start = int(index.offsets[1])
+    data_end = int(index.offsets[-1])
+
+    if workers < 2 or index.n_rows < workers:
+        return pd.read_csv(file_path, **read_csv_kwargs)
+
+    # Confini equidistanti in byte, riportati al primo inizio riga successivo
+    targets = np.linspace(data_start, data_end, workers + 1)[1:-1]
+    cuts = index.offsets[np.searchsorted(index.offsets, targets)]
+    bounds = np.unique(np.concatenate(([data_start], cuts, [data_end])))
+
+    n_parts = len(bounds) - 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(
+            _parse_byte_range,
+            [file_path] * n_parts,
+            [data_start] * n_parts,
+            bounds[:-1].tolist(),
+            bounds[1:].tolist(),
+            [read_csv_kwargs] * n_parts,
+        ))
+    df = pd.concat(parts, ignore_index=True)
+
+    conflicts = _conflicting_columns(parts)
+    if conflicts:
+        reread = pd.read_csv(file_path, **{**read_csv_kwargs, 'usecols': conflicts})
+        for col in conflicts:
+            df[col] = reread[col].to_numpy()
+    return df
+
+
+def do_rows(self: "ExcelHelper", arg):
+    """
+    Show rows of a CSV file using its byte-offset row index (built once and cached).
+
+    Usage:
+        rows 'file' N M       - Show data rows N..M-1 (0-based)
+        rows 'file' sample K  - Show K rows sampled uniformly from the file
+        rows 'file' index     - Build/refresh the row index and show the row count
+    """
+    try:
+        args = shlex.split(arg)
+    except ValueError as e:
+        print(f"\nError parsing arguments: {e}")
+        return
+
+    if len(args) < 2:
+        print("\nPlease use command 'help rows' for usage information")
+        return
+
+    filename = args[0]
+    file_path = Path(self.folder_path) / filename
+    if not filename.lower().endswith('.csv') or not file_path.is_file():
+        print(f"\nFile '{filename}' not found (only plain .csv files can be indexed).")
+        return
+
+    try:
+        if args[1] == 'index' and len(args) == 2:
+            index = get_row_index(file_path)
+            print(f"\n{filename}: {index.n_rows:,} rows indexed")
+        elif args[1] == 'sample' and len(args) == 3:
+            print(sample_rows(file_path, int(args[2])).to_string())
+        elif len(args) == 3:
+            start, stop = int(args[1]), int(args[2])
+            if start < 0 or stop < 0:
+                print("\nRow numbers must be zero or positive.")
+                return
+            print(read_rows(file_path, start, stop).to_string())
+        else:
+            print("\nInvalid rows command. Use 'help rows' for usage information.")
+    except ValueError as e:
+        print(f"\nInvalid row numbers: {e}")
+    except Exception as e:
+        print(f"\n✗ Error reading {filename}: {e}")
@@ -0,0 +1,303 @@
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import time
+import traceback
+from contextlib import contextmanager, redirect_stdout
+from pathlib import Path
+
+from xhelper.utils import is_csv_file, is_sas_file
+
+DEFAULT_IDLE_TIMEOUT = 30 * 60
+"""Secondi di inattività dopo i quali una cartella caricata viene scaricata dalla memoria"""
+
+EVICTION_INTERVAL = 30
+"""Ogni quanti secondi (al massimo) il server controlla le sessioni inattive"""
+
+
+def default_socket_path() -> str:
+    """Socket Unix di default, privato per utente."""
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return str(Path(runtime_dir) / f"xhelper-{os.getuid()}.sock")
+
+
+def folder_snapshot(folder: str, dvg_base_file=None) -> dict[str, tuple[int, int]]:
+    """Dimensione e mtime dei file caricabili di una cartella (e del dvg base file)."""
+    snapshot = {}
+    for entry in os.scandir(folder):
+        if entry.is_file() and (is_csv_file(entry.name) or is_sas_file(entry.name)):
+            stat = entry.stat()
+            snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns)
+    if dvg_base_file:
+        stat = os.stat(dvg_base_file)
+        snapshot[dvg_base_file] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+
+class _Session:
+    """Stato di una cartella caricata nel server."""
+
+    def __init__(self, helper, snapshot: dict):
+        self.helper = helper
+        self.snapshot = snapshot
+        self.last_used = time.monotonic()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Una richiesta per connessione: una riga JSON in ingresso, una riga JSON in uscita."""
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            if 'compare' in request:
+                response = self.server.run_compare(
+                    request['compare'], request.get('columns'), request.get('rolling', False), request.get('cwd'),
+                    matrix=request.get('matrix', False),
+                )
+            else:
+                response = self.server.run_command(
+                    request['folder'], request.get('dvg_base_file'), request['command'],
+                    cwd=request.get('cwd'), columns=request.get('columns'), writer=request.get('writer'),
+                )
+        except (ValueError, KeyError) as e:
+            response = {'ok': False, 'output': f"Invalid request: {e}\n"}
+        self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+
+class SessionServer(socketserver.UnixStreamServer):
+    """
+    Server che tiene in memoria un ExcelHelper per ogni cartella (frames,
+    column_locations, cache) ed esegue i comandi ricevuti sul socket.
+    Le richieste sono servite una alla volta: l'output dei comandi viene
+    catturato reindirizzando stdout e i percorsi relativi (es. transformed_data/,
+    i report di compare) sono risolti spostandosi nella cwd del client, entrambi
+    globali al processo.
+    """
+
+    def __init__(self, socket_path: str, idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        self.sessions: dict[tuple, _Session] = {}
+        self.evicted: set[tuple] = set()
+        self.idle_timeout = idle_timeout
+        super().__init__(socket_path, _RequestHandler)
+        os.chmod(socket_path, 0o600)
+        self.timeout = min(EVICTION_INTERVAL, idle_timeout)
+
+    @staticmethod
+    def _session_key(folder: str, dvg_base_file, columns) -> tuple:
+        # Una cartella letta con --columns è una sessione diversa da quella completa
+        return (os.path.abspath(folder), os.path.abspath(dvg_base_file) if dvg_base_file else None,
+                tuple(columns) if columns else None)
+
+    def _get_session(self, folder: str, dvg_base_file, columns=None) -> _Session:
+        from xhelper.core.excel_helper import ExcelHelper
+
+        key = self._session_key(folder, dvg_base_file, columns)
+        session = self.sessions.get(key)
+        if session is not None and session.snapshot != folder_snapshot(key[0], key[1]):
+            # Nuova consegna o file salvato da un altro processo: i frame in memoria non valgono più
+            unsaved = " Unsaved changes have been discarded." if session.helper.modified else ""
+            print(f"Note: files in {key[0]} changed on disk, the folder has been reloaded.{unsaved}")
+            del self.sessions[key]
+            session = None
+        if session is None:
+            if not os.path.isdir(folder):
+                raise ValueError(f"'{folder}' is not a valid directory")
+            if key in self.evicted:
+                print(f"Note: {key[0]} was unloaded after {self.idle_timeout:g}s of inactivity "
+                      f"and has been reloaded from disk.")
+                self.evicted.discard(key)
+            # Lo snapshot precede il caricamento: un file cambiato durante la lettura verrà ricaricato
+            snapshot = folder_snapshot(key[0], key[1])
+            session = _Session(ExcelHelper(key[0], dvg_base_file_path=key[1], columns=columns), snapshot)
+            self.sessions[key] = session
+            print(f"[xhelper server] Loaded folder {key[0]}", file=sys.stderr)
+        session.last_used = time.monotonic()
+        return session
+
+    @contextmanager
+    def _client_context(self, output: io.StringIO, cwd):
+        """Cattura stdout e si sposta nella cwd del client per la durata di una richiesta."""
+        previous_cwd = os.getcwd()
+        try:
+            with redirect_stdout(output):
+                if cwd:
+                    os.chdir(cwd)
+                yield
+        finally:
+            os.chdir(previous_cwd)
+
+    def run_command(self, folder: str, dvg_base_file, command: str, cwd=None, columns=None, writer=None) -> dict:
+        """Esegue un comando sulla sessione della cartella e ne ritorna l'output."""
+        output = io.StringIO()
+        ok = True
+        with self._client_context(output, cwd):
+            try:
+                if command.strip() == 'quit':
+                    # 'quit' chiede conferma su stdin: lato server chiude solo la sessione
+                    ok = self._close_session(folder, dvg_base_file, columns)
+                else:
+                    session = self._get_session(folder, dvg_base_file, columns)
+                    helper = session.helper
+                    helper.stdout = output
+                    helper.writer = writer
+                    helper.onecmd(command)
+                    # 'save' riscrive i file della cartella: i dati in memoria restano quelli aggiornati
+                    session.snapshot = folder_snapshot(session.helper.folder_path, helper.dvg_base_file_path)
+            except SystemExit:
+                # ExcelHelper esce se la cartella non contiene file utilizzabili
+                ok = False
+            except ValueError as e:
+                ok = False
+                print(f"✗ Error: {e}")
+            except Exception as e:
+                ok = False
+                print(f"✗ Error: {e}")
+                traceback.print_exc(file=sys.stderr)
+        return {'ok': ok, 'output': output.getvalue()}
+
+    def run_compare(self, folders: list, columns=None, rolling=False, cwd=None, matrix=False) -> dict:
+        """Confronta due o più cartelle come 'xhelper -f A B [C ...]'; i report vanno nella cwd del client."""
+        from xhelper.core.file_comparator import compare_folders, compare_snapshots
+
+        output = io.StringIO()
+        ok = True
+        with self._client_context(output, cwd):
+            try:
+                if len(folders) == 2 and not matrix:
+                    compare_folders(folders[0], folders[1], columns=columns)
+                else:
+                    compare_snapshots(folders[0], folders[1:], columns=columns, rolling=rolling)
+            except Exception as e:
+                ok = False
+                print(f"✗ Error: {e}")
+                traceback.print_exc(file=sys.stderr)
+        return {'ok': ok, 'output': output.getvalue()}
+
+    def _close_session(self, folder: str, dvg_base_file, columns=None) -> bool:
+        key = self._session_key(folder, dvg_base_file, columns)
+        session = self.sessions.pop(key, None)
+        if session is None:
+            print(f"Folder {key[0]} is not loaded.")
+            return False
+        if session.helper.modified:
+            print("Warning: unsaved changes have been discarded (use 'save' before 'quit').")
+        print(f"Closed session for {key[0]}.")
+        return True
+
+    def evict_idle(self):
+        """
+        Scarica le cartelle inutilizzate da più di idle_timeout secondi.
+        Le sessioni con modifiche non salvate restano in memoria finché il client
+        non esegue 'save' o 'quit'.
+        """
+        now = time.monotonic()
+        for key, session in list(self.sessions.items()):
+            if now - session.last_used < self.idle_timeout or session.helper.modified:
+                continue
+            del self.sessions[key]
+            self.evicted.add(key)
+            print(f"[xhelper server] Evicted idle folder {key[0]}", file=sys.stderr)
+
+
+def serve(socket_path=None, idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+    """Avvia il server in primo piano finché non viene interrotto (Ctrl+C)."""
+    socket_path = socket_path or default_socket_path()
+    if os.path.exists(socket_path):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                probe.connect(socket_path)
+            print(f"Error: an xhelper server is already listening on {socket_path}.")
+            return 1
+        except OSError:
+            os.unlink(socket_path)  # Socket rimasto da un server terminato male
+
+    server = SessionServer(socket_path, idle_timeout)
+    print(f"xhelper server listening on {socket_path} (idle timeout: {idle_timeout:g}s)")
+    try:
+        while True:
+            server.handle_request()
+            server.evict_idle()
+    except KeyboardInterrupt:
+        print("\nShutting down xhelper server.")
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
+    return 0
+
+
+def _send_request(request: dict, socket_path=None) -> dict:
+    socket_path = socket_path or default_socket_path()
+    # Il socket di default può stare in /tmp: non inviamo nulla a un server di un altro utente
+    if os.stat(socket_path).st_uid != os.getuid():
+        raise PermissionError(f"{socket_path} is owned by another user")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        with sock.makefile('rwb') as stream:
+            stream.write(json.dumps(request).encode('utf-8') + b'\n')
+            stream.flush()
+            return json.loads(stream.readline())
+
+
+def send_command(folder: str, command: str, dvg_base_file=None, socket_path=None, columns=None,
+                 writer=None) -> dict:
+    """Invia un comando al server e ritorna la risposta {'ok': bool, 'output': str}."""
+    request = {
+        'folder': os.path.abspath(folder), 'dvg_base_file': dvg_base_file, 'command': command,
+        'cwd': os.getcwd(), 'columns': columns, 'writer': writer,
+    }
+    return _send_request(request, socket_path)
+
+
+def run_client_compare(folders, columns=None, rolling=False, socket_path=None, matrix=False) -> int:
+    """Esegue sul server il confronto fra due o più cartelle."""
+    request = {
+        'compare': [os.path.abspath(folder) for folder in folders],
+        'columns': columns, 'rolling': rolling, 'matrix': matrix, 'cwd': os.getcwd(),
+    }
+    try:
+        response = _send_request(request, socket_path)
+    except OSError as e:
+        print(f"Error: cannot reach the xhelper server ({e}). Start it with 'xhelper --serve'.")
+        return 1
+    print(response['output'], end='')
+    return 0 if response['ok'] else 1
+
+
+def run_client(folder: str, commands, dvg_base_file=None, socket_path=None, columns=None, writer=None) -> int:
+    """
+    Client sottile: esegue i comandi indicati, oppure li legge da stdin
+    (uno per riga) se non ne sono stati passati.
+    """
+    interactive = not commands and sys.stdin.isatty()
+    if not commands:
+        commands = _read_commands(interactive)
+
+    status = 0
+    for command in commands:
+        try:
+            response = send_command(folder, command, dvg_base_file, socket_path, columns, writer)
+        except OSError as e:
+            print(f"Error: cannot reach the xhelper server ({e}). Start it with 'xhelper --serve'.")
+            return 1
+        print(response['output'], end='')
+        if not response['ok']:
+            status = 1
+        if command == 'quit':
+            break
+    return status
+
+
+def _read_commands(interactive: bool):
+    while True:
+        try:
+            line = input('>>> ') if interactive else sys.stdin.readline()
+        except EOFError:
+            return
+        if not interactive and not line:
+            return
+        if line.strip():
+            yield line.strip()
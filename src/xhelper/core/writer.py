@@ -0,0 +1,100 @@
+import bz2
+import gzip
+import lzma
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import pandas as pd
+
+from xhelper.utils import CSV_COMPRESSIONS
+
+WRITER_BACKENDS = ('parallel', 'pandas')
+"""Backend di scrittura disponibili: il primo è quello di default"""
+
+WRITE_BLOCK_ROWS = 100_000
+"""Righe serializzate da ogni worker per blocco"""
+
+PARALLEL_WRITE_MIN_ROWS = 2 * WRITE_BLOCK_ROWS
+"""Sotto questa soglia avviare i processi costa più della scrittura stessa"""
+
+
+@dataclass
+class WriteStats:
+    """Statistiche di una scrittura CSV."""
+    rows: int
+    bytes: int
+    seconds: float
+
+    @property
+    def throughput(self) -> float:
+        """MB/s scritti su disco."""
+        return self.bytes / 1e6 / self.seconds if self.seconds > 0 else float('inf')
+
+    def __str__(self):
+        return f"{self.bytes / 1e6:.1f} MB in {self.seconds:.2f}s, {self.throughput:.1f} MB/s"
+
+
+def open_csv_output(file_path):
+    """Apre file_path in scrittura testo, comprimendo in base all'estensione (zstd multithread)."""
+    ext = str(file_path).lower().rsplit('.', 1)[-1]
+    method = CSV_COMPRESSIONS.get(ext)
+    if method == 'gzip':
+        return gzip.open(file_path, 'wt', encoding='utf-8', newline='')
+    if method == 'bz2':
+        return bz2.open(file_path, 'wt', encoding='utf-8', newline='')
+    if method == 'xz':
+        return lzma.open(file_path, 'wt', encoding='utf-8', newline='')
+    if method == 'zstd':
+        import zstandard  # Dipendenza opzionale (pip install xhelper[zstd])
+        cctx = zstandard.ZstdCompressor(threads=-1)
+        return zstandard.open(file_path, 'wt', cctx=cctx, encoding='utf-8', newline='')
+    return open(file_path, 'w', encoding='utf-8', newline='')
+
+
+def _format_block(block: pd.DataFrame, header: bool) -> str:
+    # Eseguita nei processi worker: stesse opzioni di DataFrame.to_csv(path, index=False)
+    return block.to_csv(index=False, header=header, lineterminator=os.linesep)
+
+
+def _can_split(df: pd.DataFrame) -> bool:
+    """
+    Per date e durate pandas sceglie il formato guardando l'intera colonna
+    (es. solo 'YYYY-MM-DD' se tutti gli orari sono a mezzanotte): divise in
+    blocchi potrebbero essere scritte diversamente, quindi non le dividiamo.
+    """
+    return not any(
+        pd.api.types.is_datetime64_any_dtype(dtype) or pd.api.types.is_timedelta64_dtype(dtype)
+        or isinstance(dtype, pd.PeriodDtype)
+        for dtype in df.dtypes
+    )
+
+
+def write_csv(df: pd.DataFrame, file_path, backend=None, workers=None) -> WriteStats:
+    """
+    Scrive df in file_path (senza indice), con output identico a DataFrame.to_csv.
+
+    Backend:
+        'pandas'   - DataFrame.to_csv, su un solo core
+        'parallel' - blocchi di righe serializzati in parallelo da più processi
+                     e scritti nell'ordine originale (default; sui DataFrame piccoli
+                     o con colonne di date si comporta come 'pandas')
+    """
+    backend = backend or WRITER_BACKENDS[0]
+    if backend not in WRITER_BACKENDS:
+        raise ValueError(f"Unknown CSV writer '{backend}', expected one of: {', '.join(WRITER_BACKENDS)}")
+    workers = workers or os.cpu_count() or 1
+
+    start = time.perf_counter()
+    with open_csv_output(file_path) as out:
+        if backend == 'pandas' or workers < 2 or len(df) < PARALLEL_WRITE_MIN_ROWS or not _can_split(df):
+            df.to_csv(out, index=False, lineterminator=os.linesep)
+        else:
+            blocks = [df.iloc[i:i + WRITE_BLOCK_ROWS] for i in range(0, len(df), WRITE_BLOCK_ROWS)]
+            headers = [True] + [False] * (len(blocks) - 1)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for text in pool.map(_format_block, blocks, headers):
+                    out.write(text)
+    seconds = time.perf_counter() - start
+    return WriteStats(rows=len(df), bytes=os.path.getsize(file_path), seconds=seconds)
@@ -1,29 +1,135 @@
 import pandas as pd
+import pyreadstat
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
 import os
 import datetime
+import hashlib
 
+CACHE_DIR_NAME = ".xhelper_cache"
+"""Nome della cartella (dentro la cartella dati) che contiene indici e piani in cache"""
 
-def load_csv_files(folder_path) -> Dict[str, pd.DataFrame]:
+PARALLEL_PARSE_THRESHOLD = 512 * 1024 * 1024
+"""Dimensione (byte) oltre la quale un CSV viene letto in parallelo per intervalli di byte"""
+
+CSV_COMPRESSIONS = {'gz': 'gzip', 'bz2': 'bz2', 'xz': 'xz', 'zst': 'zstd'}
+"""Estensioni di compressione supportate per i CSV -> metodo di compressione pandas"""
+
+CSV_SUFFIXES = ('.csv',) + tuple(f'.csv.{ext}' for ext in CSV_COMPRESSIONS)
+"""Suffissi riconosciuti come file CSV (in chiaro o compressi)"""
+
+
+def get_cache_dir(folder_path) -> Optional[Path]:
+    """
+    Ritorna (creandola se serve) la cartella di cache associata a folder_path,
+    oppure None se non si può creare (es. cartella in sola lettura): in quel caso
+    i chiamanti lavorano senza cache.
+    """
+    cache_dir = Path(folder_path) / CACHE_DIR_NAME
+    try:
+        cache_dir.mkdir(exist_ok=True)
+    except OSError:
+        return None
+    return cache_dir
+
+
+def is_csv_file(filename) -> bool:
+    """True se il file è un CSV, in chiaro o compresso (.csv.gz, .csv.zst, ...)."""
+    return str(filename).lower().endswith(CSV_SUFFIXES)
+
+
+def strip_csv_suffix(filename: str) -> str:
+    """Rimuove '.csv' e l'eventuale estensione di compressione: 'AE.csv.zst' -> 'AE'."""
+    lower = filename.lower()
+    for suffix in sorted(CSV_SUFFIXES, key=len, reverse=True):
+        if lower.endswith(suffix):
+            return filename[:-len(suffix)]
+    return filename
+
+
+def csv_output_name(base_name: str, compress=None) -> str:
+    """Nome del CSV di output per base_name, con l'estensione di compressione richiesta."""
+    return f"{base_name}.csv" + (f".{compress}" if compress else "")
+
+
+def parse_compress_option(args: list[str]):
+    """
+    Estrae l'opzione '--compress <gz|bz2|xz|zst>' dagli argomenti di un comando.
+
+    Returns:
+        tuple: (estensione di compressione o None, argomenti rimanenti)
+    """
+    if '--compress' not in args:
+        return None, args
+    pos = args.index('--compress')
+    if pos + 1 >= len(args) or args[pos + 1] not in CSV_COMPRESSIONS:
+        raise ValueError(f"--compress must be one of: {', '.join(CSV_COMPRESSIONS)}")
+    return args[pos + 1], args[:pos] + args[pos + 2:]
+
+
+def pop_flag(args: list[str], flag: str):
+    """
+    Estrae un'opzione booleana (es. '--force') dagli argomenti di un comando.
+
+    Returns:
+        tuple: (True se presente, argomenti rimanenti)
+    """
+    return flag in args, [a for a in args if a != flag]
+
+
+def hash_files(*paths) -> str:
+    """SHA-256 del contenuto dei file indicati, letti a blocchi."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as fh:
+            for block in iter(lambda: fh.read(1024 * 1024), b''):
+                digest.update(block)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def load_csv_files(folder_path, columns=None) -> Dict[str, pd.DataFrame]:
         """
         Carica i file CSV dalla cartella specificata.
 
+        Args:
+            columns: se indicato, legge solo queste colonne (usecols) e salta
+                     i file che non ne contengono nessuna.
+
         Returns:
             Dict[str, pd.DataFrame]: Dizionario {nome_file: DataFrame},
                                      or empty {}
         """
         data = {}
-        csv_files = [f for f in os.listdir(folder_path) if f.lower().endswith('.csv')]
+        csv_files = [f for f in os.listdir(folder_path) if is_csv_file(f)]
 
         if not csv_files:
             return data  # Ritorna dizionario vuoto se non trova CSV
 
+        # Import locale: row_index dipende a sua volta da utils
+        from xhelper.core.row_index import read_csv_parallel
+        from xhelper.core.projection import projected_folder_headers, map_header_locations, plan_projection
+
+        usecols_plan = {}
+        if columns:
+            # Proiezione: prima le sole intestazioni, poi ogni file legge solo le colonne richieste
+            headers = projected_folder_headers(folder_path, csv_files)
+            usecols_plan = plan_projection(map_header_locations(headers), columns)
+            print(f"\nColumn projection: reading {len(columns)} columns from "
+                  f"{len(usecols_plan)} of {len(csv_files)} CSV files")
+            csv_files = [f for f in csv_files if f in usecols_plan]
+
         print("\nLoading CSV files...")
         for file in csv_files:
             try:
                 file_path = Path(folder_path) / file
-                df = pd.read_csv(filepath_or_buffer=file_path, parse_dates=True)
+                if (file.lower().endswith('.csv') and os.path.getsize(file_path) >= PARALLEL_PARSE_THRESHOLD
+                        and (os.cpu_count() or 1) > 1):
+                    # File molto grandi: parsing su più core, un intervallo di righe per worker
+                    df = read_csv_parallel(file_path, parse_dates=True, usecols=usecols_plan.get(file))
+                else:
+                    # I CSV compressi vengono decompressi in streaming da pandas
+                    df = pd.read_csv(filepath_or_buffer=file_path, parse_dates=True, usecols=usecols_plan.get(file))
                 data[file] = df
                 print(f"✓ Loaded: {file} ({len(df.columns)} columns, {len(df)} rows)")
             except Exception as e:
@@ -40,10 +146,64 @@ def load_csv_file(file_path: str) -> pd.DataFrame:
     return df
 
 
+def is_sas_file(filename) -> bool:
+    return str(filename).lower().endswith('.sas7bdat')
+
+
+def load_sas_metadata(folder_path) -> dict:
+    """
+    Indicizza i file .sas7bdat della cartella leggendo solo i metadati
+    (nomi, etichette e tipi delle colonne, numero di righe), senza i dati.
+
+    Returns:
+        dict: {nome_file: metadata pyreadstat}
+    """
+    metadata = {}
+    sas_files = [f for f in os.listdir(folder_path) if is_sas_file(f)]
+    if not sas_files:
+        return metadata
+
+    print("\nIndexing SAS files...")
+    for file in sas_files:
+        try:
+            _, meta = pyreadstat.read_sas7bdat(Path(folder_path) / file, metadataonly=True)
+            metadata[file] = meta
+            rows = f"{meta.number_rows} rows" if meta.number_rows is not None else "unknown rows"
+            print(f"✓ Indexed: {file} ({len(meta.column_names)} columns, {rows})")
+        except Exception as e:
+            print(f"✗ Error indexing {file}: {e}")
+    return metadata
+
+
+def read_sas_header(file_path) -> list[str]:
+    """Colonne di un file .sas7bdat, dai soli metadati."""
+    _, meta = pyreadstat.read_sas7bdat(file_path, metadataonly=True)
+    return list(meta.column_names)
+
+
+def load_sas_file(file_path, usecols=None) -> pd.DataFrame:
+    """Legge i dati di un file .sas7bdat, eventualmente solo le colonne indicate."""
+    df, _ = pyreadstat.read_sas7bdat(file_path, usecols=usecols)
+    return df
+
+
+def column_fingerprint(series: pd.Series) -> str:
+    """
+    Impronta del contenuto di una colonna (hash vettoriale dei valori, nello stesso ordine, più il dtype).
+    Due colonne con la stessa impronta sono identiche, indipendentemente dal nome.
+    """
+    hashes = pd.util.hash_pandas_object(series, index=False).to_numpy()
+    digest = hashlib.blake2b(hashes.tobytes(), digest_size=16)
+    digest.update(str(series.dtype).encode())
+    return digest.hexdigest()
+
 
-def _write_txt_report(lines):
-    """Scrive il report in un file .txt con data e ora nel nome, senza codici ANSI."""
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+def _write_txt_report(lines, timestamp=None):
+    """
+    Scrive il report in un file .txt con data e ora nel nome, senza codici ANSI.
+    Passando timestamp il nome coincide con quello degli altri report della stessa esecuzione.
+    """
+    timestamp = timestamp or datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     txt_name = f"compare_result_{timestamp}.txt"
     try:
         with open(txt_name, "w", encoding="utf-8") as f:
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as tm
+
+from xhelper.core.row_index import get_row_index, read_csv_parallel, read_rows, sample_rows
+
+
+def _write(path, text: str):
+    path.write_bytes(text.encode('utf-8'))
+    return path
+
+
+def test_quoted_newlines_are_not_row_boundaries(tmp_path):
+    path = _write(tmp_path / 't.csv', 'a,b\n1,"x\ny"\n2,"z"\n')
+    index = get_row_index(path)
+    assert index.n_rows == 2
+    assert read_rows(path, 0, 2)['b'].tolist() == ['x\ny', 'z']
+
+
+def test_read_csv_parallel_matches_read_csv(tmp_path):
+    n = 20_000
+    df = pd.DataFrame({
+        'int': np.arange(n),
+        # Numeri in tutti gli intervalli tranne l'ultimo, dove compare del testo
+        'mixed': [str(i) for i in range(n - 5)] + ['abc'] * 5,
+        # Interi nella prima metà, float con mancanti nella seconda
+        'sparse': [1] * (n // 2) + [np.nan, 2.5] * (n // 4),
+        # Booleani in una metà, vuoti nell'altra
+        'flag': [True] * (n // 2) + [None] * (n // 2),
+        'text': [f'"q{i}", x' for i in range(n)],
+    })
+    path = tmp_path / 't.csv'
+    df.to_csv(path, index=False)
+
+    expected = pd.read_csv(path, low_memory=False)
+    result = read_csv_parallel(path, workers=4, low_memory=False)
+
+    tm.assert_frame_equal(result, expected)
+
+
+def test_read_csv_parallel_with_usecols(tmp_path):
+    n = 10_000
+    df = pd.DataFrame({'a': np.arange(n), 'b': [str(i) for i in range(n - 1)] + ['x'], 'c': 1.5})
+    path = tmp_path / 't.csv'
+    df.to_csv(path, index=False)
+
+    expected = pd.read_csv(path, usecols=['a', 'b'])
+    tm.assert_frame_equal(read_csv_parallel(path, workers=3, usecols=['a', 'b']), expected)
+
+
+def test_blank_lines_keep_row_labels(tmp_path):
+    path = _write(tmp_path / 't.csv', 'a,b\n1,2\n\n3,4\n5,6\n')
+
+    rows = read_rows(path, 1, 3)
+    assert rows.index.tolist() == [1, 2]
+    assert rows['a'].isna().iloc[0] and rows['a'].iloc[1] == 3
+
+    sample = sample_rows(path, 4, seed=0)
+    assert sample.index.tolist() == [0, 1, 2, 3]
+    assert sample['a'].tolist()[2:] == [3, 5]
+
+
+def test_read_rows_clamps_bounds(tmp_path):
+    path = _write(tmp_path / 't.csv', 'a\n1\n2\n3\n')
+    assert read_rows(path, -3, 2).index.tolist() == [0, 1]
+    assert read_rows(path, 2, 99)['a'].tolist() == [3]
@@ -0,0 +1,76 @@
+import gzip
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from xhelper.core import writer
+from xhelper.core.writer import write_csv
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    # Blocchi piccoli: il percorso parallelo viene usato anche su pochi dati
+    monkeypatch.setattr(writer, 'WRITE_BLOCK_ROWS', 1_000)
+    monkeypatch.setattr(writer, 'PARALLEL_WRITE_MIN_ROWS', 2_000)
+
+
+def _mixed_frame(n: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    floats = rng.normal(size=n)
+    floats[::7] = np.nan
+    ints = pd.array(rng.integers(0, 100, size=n), dtype='Int64')
+    ints[::11] = pd.NA
+    text = pd.Series([f'value {i}, "quoted"' if i % 3 else None for i in range(n)])
+    return pd.DataFrame({
+        'float': floats,
+        'int': ints,
+        'bool': rng.integers(0, 2, size=n).astype(bool),
+        'text': text,
+        'plain': pd.Series([f'r{i}' for i in range(n)], dtype='str'),
+    })
+
+
+def _expected_bytes(df: pd.DataFrame, path) -> bytes:
+    df.to_csv(path, index=False)
+    return path.read_bytes()
+
+
+def test_parallel_matches_to_csv(tmp_path, small_blocks):
+    df = _mixed_frame(5_500)
+    assert len(df) >= writer.PARALLEL_WRITE_MIN_ROWS
+
+    stats = write_csv(df, tmp_path / 'parallel.csv', backend='parallel', workers=3)
+
+    assert (tmp_path / 'parallel.csv').read_bytes() == _expected_bytes(df, tmp_path / 'expected.csv')
+    assert stats.rows == len(df)
+
+
+def test_pandas_backend_matches_to_csv(tmp_path):
+    df = _mixed_frame(500)
+    write_csv(df, tmp_path / 'pandas.csv', backend='pandas')
+    assert (tmp_path / 'pandas.csv').read_bytes() == _expected_bytes(df, tmp_path / 'expected.csv')
+
+
+def test_datetime_columns_fall_back_to_single_write(tmp_path, small_blocks):
+    # Solo il primo blocco ha orari diversi da mezzanotte: scritti a blocchi cambierebbe il formato
+    dates = pd.Series(pd.date_range('2024-01-01', periods=5_000, freq='D'))
+    dates[0] = dates[0] + pd.Timedelta(hours=3)
+    df = pd.DataFrame({'date': dates, 'value': np.arange(len(dates))})
+    assert not writer._can_split(df)
+
+    write_csv(df, tmp_path / 'dates.csv', backend='parallel', workers=3)
+
+    assert (tmp_path / 'dates.csv').read_bytes() == _expected_bytes(df, tmp_path / 'expected.csv')
+
+
+def test_gzip_output_matches_to_csv(tmp_path, small_blocks):
+    df = _mixed_frame(3_000)
+    write_csv(df, tmp_path / 'out.csv.gz', backend='parallel', workers=2)
+    with gzip.open(tmp_path / 'out.csv.gz', 'rb') as fh:
+        assert fh.read() == _expected_bytes(df, tmp_path / 'expected.csv')
+
+
+def test_unknown_backend(tmp_path):
+    with pytest.raises(ValueError):
+        write_csv(pd.DataFrame({'a': [1]}), tmp_path / 'x.csv', backend='arrow')